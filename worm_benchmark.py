@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Worm Game benchmarks - headless timings compared against a stored baseline
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import platform
+from datetime import datetime
+
+# Render into an off-screen surface; must be set before pygame is imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import worm_game
+from worm_game import (WormAI, WormGame, WormVecEnv, PrioritizedReplayBuffer, RollingStats,
+                       STATE_SIZE, GRID_WIDTH, GRID_HEIGHT, HAS_TORCH)
+
+# Benchmark settings
+BASELINE_PATH = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.10  # Relative slowdown that counts as a regression
+BUFFER_SIZES = (1000, 10000, 100000, 1000000)
+BATCH_SIZES = (32, 64, 128, 256)
+WORM_LENGTHS = (1, 50, 200, 800)
+
+def timed(function, repeats, warmup=5):
+    """Call function repeatedly; returns the RollingStats summary of its run times"""
+    for _ in range(warmup):
+        function()
+    stats = RollingStats(window=repeats)
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        stats.add(time.perf_counter() - start)
+    return stats.summary()
+
+def random_transitions(count):
+    return (np.random.rand(count, STATE_SIZE).astype(np.float32),
+            np.random.randint(0, 4, count),
+            np.random.randn(count).astype(np.float32),
+            np.random.rand(count, STATE_SIZE).astype(np.float32),
+            (np.random.rand(count) < 0.05).astype(np.float32))
+
+def bench_game_steps(steps):
+    """WormGame.update() with learning, as in headless training"""
+    game = WormGame(headless=True, ai=WormAI())
+    start = time.perf_counter()
+    for _ in range(steps):
+        game.update()
+        if game.game_over:
+            game.reset_game()
+    return steps / (time.perf_counter() - start)
+
+def bench_vec_env(steps, num_envs=256, trials=3):
+    """Best of a few trials, since short runs are noisy"""
+    env = WormVecEnv(num_envs, seed=0)
+    env.reset()
+    actions = np.random.randint(0, 4, (steps, num_envs))
+    best = 0.0
+    for _ in range(trials):
+        start = time.perf_counter()
+        for step in range(steps):
+            env.step(actions[step])
+        best = max(best, steps * num_envs / (time.perf_counter() - start))
+    return best
+
+def bench_sample(capacity, repeats):
+    buffer = PrioritizedReplayBuffer(capacity)
+    for offset in range(0, capacity, 100000):
+        buffer.add_batch(*random_transitions(min(100000, capacity - offset)))
+    return timed(lambda: buffer.sample(worm_game.BATCH_SIZE), repeats)
+
+def bench_learn(batch_size, repeats):
+    ai = WormAI(batch_size=batch_size)
+    ai.memory.add_batch(*random_transitions(len(ai.memory.storage.states)))
+    return timed(ai.learn, repeats)
+
+def serpentine_path():
+    """Every board cell in one connected back-and-forth sweep"""
+    path = []
+    for y in range(GRID_HEIGHT):
+        xs = range(GRID_WIDTH) if y % 2 == 0 else range(GRID_WIDTH - 1, -1, -1)
+        path.extend((x, y) for x in xs)
+    return path
+
+def bench_draw(length, repeats):
+    """draw() while a worm of the given length crawls along the board"""
+    game = WormGame(ai=WormAI())
+    path = serpentine_path()
+    repeats = min(repeats, len(path) - length - 1)
+    game.worm.clear()
+    for cell in path[:length]:
+        game.worm.push_head(cell)
+    game.food = path[-1]
+    game.draw(full=True)
+
+    position = [length]
+    def frame():
+        # Advance one cell so the renderer does its usual incremental work
+        game.worm.push_head(path[position[0]])
+        game.worm.pop_tail()
+        game.episode_steps += 1
+        position[0] += 1
+        game.draw()
+    return timed(frame, repeats, warmup=0)
+
+def run_benchmarks(quick=False):
+    """Run every benchmark; returns {name: {"value", "unit", "higher_is_better"}}"""
+    scale = 0.2 if quick else 1.0
+    repeats = max(20, int(200 * scale))
+    results = {}
+
+    def record(name, value, unit, higher_is_better):
+        results[name] = {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{name:<28} {value:>14.3f} {unit}")
+
+    record("vec_env.steps_per_s", bench_vec_env(int(500 * scale)), "steps/s", True)
+    if HAS_TORCH:
+        record("game.update.steps_per_s", bench_game_steps(int(2000 * scale)), "steps/s", True)
+        for capacity in BUFFER_SIZES:
+            record(f"replay.sample.{capacity}.p50", bench_sample(capacity, repeats * 5)["p50_ms"], "ms", False)
+        for batch_size in BATCH_SIZES:
+            record(f"learn.batch_{batch_size}.p50", bench_learn(batch_size, repeats)["p50_ms"], "ms", False)
+    for length in WORM_LENGTHS:
+        record(f"draw.length_{length}.p50", bench_draw(length, repeats)["p50_ms"], "ms", False)
+    return results
+
+def compare(results, baseline, threshold):
+    """Names of metrics that got worse than baseline by more than threshold"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base["value"] <= 0:
+            continue
+        if result["higher_is_better"]:
+            change = base["value"] / max(result["value"], 1e-12) - 1.0
+        else:
+            change = result["value"] / base["value"] - 1.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{name:<28} {base['value']:>14.3f} -> {result['value']:>14.3f} {result['unit']:<8} "
+              f"slowdown {change * 100:+7.1f}% {marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worm Game benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json", metavar="FILE",
+                        help="where to write this run's results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, metavar="FILE",
+                        help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression (0.1 = 10%%)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer repetitions, for a fast smoke run")
+    args = parser.parse_args()
+
+    results = run_benchmarks(quick=args.quick)
+    report = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "quick": args.quick,
+        "results": results
+    }
+    write_json(args.output, report)
+
+    if args.update_baseline:
+        write_json(args.baseline, report)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        sys.exit(0)
+
+    print()
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold * 100:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No regressions")
@@ -8,10 +8,22 @@ import sys
 import time
 import random
 import logging
+import warnings
 import math
-from collections import deque
+import re
+import copy
+import argparse
+import queue
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque, OrderedDict
+from itertools import islice, product
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime
 import json
+import zlib
+import struct
 
 # Configure logging
 logging.basicConfig(
@@ -25,22 +37,17 @@ try:
     import pygame
     import numpy as np
     
-    # Try to import PyTorch dependencies
+    # Try to import PyTorch dependencies; WORM_NUMPY_POLICY skips them entirely
     try:
+        if os.getenv("WORM_NUMPY_POLICY"):
+            raise ImportError("WORM_NUMPY_POLICY is set")
         import torch
         import torch.nn as nn
         import torch.optim as optim
         import torch.nn.functional as F
-        
-        # Try to import torchrl for PrioritizedReplayBuffer
-        try:
-            from torchrl.data import PrioritizedReplayBuffer
-            HAS_TORCHRL = True
-        except ImportError:
-            logging.warning("torchrl not available, falling back to basic replay buffer")
-            HAS_TORCHRL = False
+        from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
     except ImportError:
-        logging.warning("PyTorch not available, falling back to random movement")
+        logging.warning("PyTorch not available, falling back to the NumPy policy or random movement")
         HAS_TORCH = False
     else:
         HAS_TORCH = True
@@ -48,6 +55,7 @@ try:
     # Try to import requests for Grok API
     try:
         import requests
+        from requests.adapters import HTTPAdapter
         import dotenv
         dotenv.load_dotenv()
         HAS_REQUESTS = True
@@ -59,7 +67,7 @@ try:
 except ImportError as e:
     logging.error(f"Critical dependency missing: {e}")
     print(f"Error: Missing critical dependency: {e}")
-    print("Please install required packages: pip install pygame numpy torch torchrl requests python-dotenv")
+    print("Please install required packages: pip install pygame numpy torch requests python-dotenv")
     HAS_PYGAME = False
     sys.exit(1)
 
@@ -70,6 +78,8 @@ GRID_HEIGHT = 30  # 600 // GRID_SIZE
 WINDOW_WIDTH = GRID_WIDTH * GRID_SIZE
 WINDOW_HEIGHT = GRID_HEIGHT * GRID_SIZE + 100  # Extra space for stats
 FPS = 60
+TEXT_CACHE_SIZE = 128  # Rendered text surfaces kept between frames
+PROFILE_EXPORT_EVERY = 600  # Frames between profiler exports
 
 # Colors
 BLACK = (0, 0, 0)
@@ -79,6 +89,10 @@ WHITE = (255, 255, 255)
 YELLOW = (255, 255, 0)
 BLUE = (0, 191, 255)
 PURPLE = (186, 85, 211)
+HUD_BACKGROUND = (30, 30, 30)
+
+# Worm segment colours from head to tail; segments past the end use the last
+SEGMENT_COLORS = tuple((0, max(50, 255 - (i * 5)), 0) for i in range(42))
 
 # Directions
 UP = 0
@@ -86,6 +100,10 @@ RIGHT = 1
 DOWN = 2
 LEFT = 3
 
+# Grid offsets for each direction (indexed by UP, RIGHT, DOWN, LEFT)
+DIRECTION_DX = (0, 1, 0, -1)
+DIRECTION_DY = (-1, 0, 1, 0)
+
 # AI constants
 STATE_SIZE = 11  # Distance to walls, food, and self in 8 directions + length
 ACTION_SIZE = 4  # Up, Right, Down, Left
@@ -98,6 +116,72 @@ LEARNING_RATE = 0.001
 MEMORY_SIZE = 10000
 UPDATE_TARGET_EVERY = 5
 LSTM_HIDDEN_SIZE = 128
+DEATH_REWARD = -1.0  # Reward reported by WormVecEnv for a fatal move
+LEARNER_TRAIN_RATIO = 1.0  # Background learner updates per env step (0 = unlimited)
+LEARNER_PUBLISH_EVERY = 10  # Background learner updates between acting-weight swaps
+CHECKPOINT_PATH = "worm_checkpoint.pt"
+CHECKPOINT_EVERY = 50000  # Env steps between periodic checkpoints
+CHECKPOINT_COPY_BYTES = 1 << 20  # Replay copied per lock hold while checkpointing
+RECORDING_CHUNK_BYTES = 65536  # Uncompressed episode bytes buffered per recording chunk
+DEATH_CAUSES = (None, "wall", "self", "full", "starved")  # Recorded as the index into this tuple
+RECORDING_MAGIC = b"WREC\x01"  # File signature and format version
+RECORDING_CHUNK = struct.Struct("<II")  # Compressed size, episode count
+RECORDING_EPISODE = struct.Struct("<QIIBB")  # Seed, steps, score, death cause, flags (1 = Q-values)
+RECORDING_NO_Q_VALUES = np.full(ACTION_SIZE, np.nan, dtype=np.float32)  # Stored for random moves
+PLAYBACK_SEEK_STEPS = 100  # Steps skipped by LEFT/RIGHT while watching a recording
+PLAYBACK_MAX_SPEED = 1024  # Most steps played per displayed frame
+
+# Offline training constants
+OFFLINE_BATCH_SIZE = 256  # Transitions per offline update
+OFFLINE_SHUFFLE_SIZE = 100000  # Transitions held in the shuffle buffer
+OFFLINE_PREFETCH = 8  # Batches the loader thread prepares ahead
+OFFLINE_SHARD_SIZE = 100000  # Transitions per written shard and per streamed chunk
+TRANSITION_FIELDS = ("states", "actions", "rewards", "next_states", "dones")
+
+# Evaluation constants
+EVAL_EPISODES = 1000  # Seeds 0 .. N-1 played by --evaluate
+EVAL_STARVATION_STEPS = 1000  # Steps without food before an evaluation episode counts as starved
+EVAL_SEEDS_PER_TASK = 16  # Episodes per pool task
+
+# Hyperparameter sweep constants; the space uses WormAI keyword arguments
+SWEEP_SPACE = {
+    "batch_size": [32, 64, 128],
+    "gamma": [0.95, 0.99],
+    "epsilon_decay": [0.99, 0.995, 0.999],
+    "learning_rate": [0.0003, 0.001, 0.003],
+    "replay_size": [10000, 50000],
+    "update_target_every": [5, 50],
+    "lstm_hidden_size": [64, 128]
+}
+SWEEP_BUDGET = 27000  # Env steps trained by trials that survive every rung
+SWEEP_MIN_BUDGET = 1000  # Fewest env steps a first rung may train
+SWEEP_ETA = 3  # Each rung keeps the best 1/ETA of its trials
+SWEEP_TRIALS = 27  # Configurations drawn by random search
+SWEEP_EVAL_EPISODES = 32  # Greedy episodes scored after every rung
+
+# Prioritized replay constants
+PER_ALPHA = 0.6  # How strongly priorities skew sampling (0 = uniform)
+PER_BETA_START = 0.4  # Initial importance-sampling correction
+PER_BETA_FRAMES = 100000  # Samples over which beta anneals to 1.0
+PER_EPSILON = 1e-6  # Keeps every transition sampleable
+
+# Sequence replay constants (recurrent training mode)
+SEQUENCE_LENGTH = 20  # Steps trained per stored sequence
+BURN_IN_LENGTH = 10  # Preceding steps replayed only to warm up the LSTM state
+SEQUENCE_BATCH_SIZE = 16  # Sequences per learning step
+SEQUENCE_PRIORITY_ETA = 0.9  # Weight of max vs mean TD error in a sequence's priority
+
+# Ape-X distributed training
+APEX_MEMORY_SIZE = 200000  # Shared replay capacity, split evenly between actors
+APEX_ENVS_PER_ACTOR = 16  # Boards each actor steps with one batched forward
+APEX_PUBLISH_EVERY = 50  # Learner updates between weight broadcasts
+APEX_SYNC_EVERY = 400  # Actor steps between checks for new weights
+APEX_EPSILON_BASE = 0.4  # Actor i explores with BASE ** (1 + ALPHA * i / (N - 1))
+APEX_EPSILON_ALPHA = 7
+
+# Grok response cache
+GROK_CACHE_SIZE = 256  # Most distinct prompts kept
+GROK_CACHE_TTL = 600  # Seconds before a cached reply is requested again
 
 # Existential dialogue options
 INNER_VOICE_1 = [
@@ -152,7 +236,125 @@ GROK_RESPONSES = [
     "Don't look for meaning. Look for RedBlocks. That's how @Eddywoodss pays the bills."
 ]
 
-class DQNModel(nn.Module):
+class RollingStats:
+    """Rolling window of timing samples with percentile summaries"""
+    
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        
+    def summary(self):
+        """Mean and percentiles of the window, in milliseconds"""
+        if not self.samples:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+        samples = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * 1000.0
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {"count": self.count, "mean_ms": float(samples.mean()),
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+class FrameProfiler:
+    """Per-phase timings with rolling percentiles, for finding frame hitches
+    
+    begin(name) and end(name) bracket a phase and end_frame() closes a
+    frame. While disabled every call returns at once, so the calls can
+    stay in place. Summaries can be drawn over the game and are appended
+    to a .jsonl or .csv file every export_every frames.
+    """
+    
+    def __init__(self, enabled=False, export_path=None, export_every=PROFILE_EXPORT_EVERY):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.export_every = export_every
+        self.show_overlay = False
+        self.stats = {}
+        self.starts = {}
+        self.frames = 0
+        self.frame_start = time.perf_counter()
+        
+    def begin(self, name):
+        if self.enabled:
+            self.starts[name] = time.perf_counter()
+            
+    def end(self, name):
+        if not self.enabled:
+            return
+        start = self.starts.pop(name, None)
+        if start is not None:
+            self.record(name, time.perf_counter() - start)
+            
+    def record(self, name, seconds):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = RollingStats()
+        stats.add(seconds)
+        
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.record("frame", now - self.frame_start)
+        self.frame_start = now
+        self.frames += 1
+        if self.export_path and self.frames % self.export_every == 0:
+            self.export()
+            
+    def summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+    
+    def overlay_lines(self):
+        """One line per phase, slowest p99 first"""
+        rows = sorted(self.summary().items(), key=lambda item: item[1]["p99_ms"], reverse=True)
+        return [f"{name}: p50 {s['p50_ms']:.2f}  p95 {s['p95_ms']:.2f}  p99 {s['p99_ms']:.2f} ms"
+                for name, s in rows]
+    
+    def export(self):
+        """Append the current summary to export_path (CSV rows or one JSON line)"""
+        if not self.export_path:
+            return
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        summary = self.summary()
+        try:
+            if self.export_path.endswith(".csv"):
+                new_file = not os.path.exists(self.export_path)
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    if new_file:
+                        f.write("time,frame,phase,count,mean_ms,p50_ms,p95_ms,p99_ms\n")
+                    for name, s in summary.items():
+                        f.write(f"{timestamp},{self.frames},{name},{s['count']},{s['mean_ms']:.4f},"
+                                f"{s['p50_ms']:.4f},{s['p95_ms']:.4f},{s['p99_ms']:.4f}\n")
+            else:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"time": timestamp, "frame": self.frames, "phases": summary}) + "\n")
+        except Exception as e:
+            logging.warning(f"Could not export profile to {self.export_path}: {e}")
+
+class ActionReasoning:
+    """Reasoning text for one action, only formatted when something reads it"""
+    
+    __slots__ = ("action", "q_values", "prevented_turn", "text")
+    
+    def __init__(self, action, q_values):
+        self.action = action
+        self.q_values = q_values
+        self.prevented_turn = False
+        self.text = None
+        
+    def __str__(self):
+        if self.text is None:
+            if self.q_values is None:
+                text = "Reasoning: Exploring (No Q-values available)"
+            else:
+                text = f"Reasoning: Action {self.action} (Q-values: {self.q_values.round(2)})"
+            if self.prevented_turn:
+                text += " (Prevented 180° turn)"
+            self.text = text
+        return self.text
+
+class DQNModel(nn.Module if HAS_TORCH else object):
     """Deep Q-Network with LSTM for temporal reasoning"""
     
     def __init__(self, state_size, action_size, lstm_hidden_size):
@@ -192,56 +394,619 @@ class DQNModel(nn.Module):
         
         return x, hidden
     
+    def forward_sequence(self, states, lengths, hidden=None):
+        """Q-values for padded (batch, time, features) sequences
+        
+        Sequences are packed by length, so the LSTM never steps through
+        padding. Returns (batch, time, actions) Q-values, zero past each
+        sequence's length, and the LSTM state after each one's last step.
+        """
+        x = F.relu(self.fc1(states))
+        x = F.relu(self.fc2(x))
+        
+        packed = pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+        packed, hidden = self.lstm(packed, hidden)
+        x, _ = pad_packed_sequence(packed, batch_first=True, total_length=states.shape[1])
+        
+        x = F.relu(self.fc3(x))
+        x = self.fc4(x)
+        
+        return x, hidden
+    
     def init_hidden(self, batch_size=1):
         return (torch.zeros(1, batch_size, self.lstm_hidden_size),
                 torch.zeros(1, batch_size, self.lstm_hidden_size))
+    
+    def export_numpy(self, path):
+        """Write the weights to a compressed .npz that NumpyDQN can load"""
+        weights = {name.replace(".", "_"): tensor.detach().cpu().numpy().astype(np.float32)
+                   for name, tensor in self.state_dict().items()}
+        np.savez_compressed(path, **weights)
+        logging.info(f"Exported NumPy policy weights to {path}")
+
+class NumpyDQN:
+    """Pure-NumPy forward pass of an exported DQNModel, LSTM state included
+    
+    Mirrors DQNModel.forward() for single steps, so a trained worm can run
+    where PyTorch is not installed. Hidden state is a pair of
+    (batch, hidden) arrays instead of torch's (1, batch, hidden) tensors.
+    """
+    
+    def __init__(self, weights):
+        self.fc1_w = weights["fc1_weight"].T.copy()
+        self.fc1_b = weights["fc1_bias"]
+        self.fc2_w = weights["fc2_weight"].T.copy()
+        self.fc2_b = weights["fc2_bias"]
+        self.lstm_ih = weights["lstm_weight_ih_l0"].T.copy()
+        self.lstm_hh = weights["lstm_weight_hh_l0"].T.copy()
+        self.lstm_b = weights["lstm_bias_ih_l0"] + weights["lstm_bias_hh_l0"]
+        self.fc3_w = weights["fc3_weight"].T.copy()
+        self.fc3_b = weights["fc3_bias"]
+        self.fc4_w = weights["fc4_weight"].T.copy()
+        self.fc4_b = weights["fc4_bias"]
+        self.lstm_hidden_size = self.lstm_hh.shape[0]
+        
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name].astype(np.float32) for name in data.files})
+        
+    def init_hidden(self, batch_size=1):
+        return (np.zeros((batch_size, self.lstm_hidden_size), dtype=np.float32),
+                np.zeros((batch_size, self.lstm_hidden_size), dtype=np.float32))
+    
+    @staticmethod
+    def _sigmoid(x):
+        return 0.5 * (np.tanh(0.5 * x) + 1.0)
+    
+    def forward(self, state, hidden=None):
+        """Q-values for a (batch, features) state and the next hidden state"""
+        state = np.atleast_2d(state).astype(np.float32, copy=False)
+        if hidden is None:
+            hidden = self.init_hidden(state.shape[0])
+        h, c = hidden
+        
+        x = np.maximum(state @ self.fc1_w + self.fc1_b, 0.0)
+        x = np.maximum(x @ self.fc2_w + self.fc2_b, 0.0)
+        
+        # LSTM cell; torch orders the gates input, forget, cell, output
+        gates = x @ self.lstm_ih + h @ self.lstm_hh + self.lstm_b
+        i, f, g, o = np.split(gates, 4, axis=1)
+        c = self._sigmoid(f) * c + self._sigmoid(i) * np.tanh(g)
+        h = self._sigmoid(o) * np.tanh(c)
+        
+        x = np.maximum(h @ self.fc3_w + self.fc3_b, 0.0)
+        x = x @ self.fc4_w + self.fc4_b
+        
+        return x, (h, c)
+
+class SumTree:
+    """Binary sum tree over leaf priorities with O(log N) updates and prefix-sum search"""
+    
+    def __init__(self, capacity, tree=None):
+        self.capacity = capacity
+        self.leaf_count = self.node_count(capacity) // 2
+        # Node 1 is the root; the children of node i are 2i and 2i + 1.
+        # An existing node array (e.g. a memmap) may be passed in as tree.
+        self.tree = tree if tree is not None else np.zeros(2 * self.leaf_count, dtype=np.float64)
+        
+    @staticmethod
+    def node_count(capacity):
+        """Length of the node array for a tree over capacity leaves"""
+        leaf_count = 1
+        while leaf_count < capacity:
+            leaf_count *= 2
+        return 2 * leaf_count
+        
+    @property
+    def total(self):
+        return self.tree[1]
+    
+    def get(self, indices):
+        """Leaf priorities at the given indices"""
+        return self.tree[np.asarray(indices) + self.leaf_count]
+    
+    def set(self, index, priority):
+        """Set a single leaf; cheaper than update() for one index"""
+        node = index + self.leaf_count
+        tree = self.tree
+        tree[node] = priority
+        node //= 2
+        while node >= 1:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+    
+    def update(self, indices, priorities):
+        """Set a batch of leaves and refresh their ancestors level by level"""
+        tree = self.tree
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaf_count
+        tree[nodes] = priorities
+        # All leaves share a depth, so every level is one vectorized pass;
+        # duplicate parents just write the same sum twice
+        for _ in range(self.leaf_count.bit_length() - 1):
+            nodes >>= 1
+            tree[nodes] = tree[2 * nodes] + tree[2 * nodes + 1]
+    
+    def rebuild(self):
+        """Recompute every internal node from the leaves"""
+        tree = self.tree
+        count = self.leaf_count
+        while count > 1:
+            count //= 2
+            tree[count:2 * count] = tree[2 * count:4 * count:2] + tree[2 * count + 1:4 * count:2]
+    
+    def find(self, values):
+        """Leaf index whose prefix-sum interval contains each value"""
+        tree = self.tree
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.leaf_count.bit_length() - 1):
+            nodes <<= 1
+            left_sum = tree[nodes]
+            go_right = values > left_sum
+            values -= left_sum * go_right
+            nodes += go_right
+        # Rounding can land past the last filled leaf; callers clamp to size
+        return nodes - self.leaf_count
+
+class ReplayStorage:
+    """Ring of transitions held in preallocated contiguous arrays, one per field"""
+    
+    def __init__(self, capacity, state_size=STATE_SIZE):
+        self.capacity = capacity
+        self.state_size = state_size
+        self.states = self.allocate("states", (capacity, state_size), np.float32)
+        self.next_states = self.allocate("next_states", (capacity, state_size), np.float32)
+        self.actions = self.allocate("actions", (capacity,), np.int64)
+        self.rewards = self.allocate("rewards", (capacity,), np.float32)
+        self.dones = self.allocate("dones", (capacity,), np.float32)
+        
+    def allocate(self, name, shape, dtype):
+        """Create the backing array for one field"""
+        return np.zeros(shape, dtype=dtype)
+    
+    def write(self, index, state, action, reward, next_state, done):
+        self.states[index] = state
+        self.next_states[index] = next_state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.dones[index] = done
+        
+    def write_batch(self, indices, states, actions, rewards, next_states, dones):
+        self.states[indices] = states
+        self.next_states[indices] = next_states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+    
+    def gather(self, indices, batch):
+        """Copy the given rows straight into a ReplayBatch's arrays"""
+        np.take(self.states, indices, axis=0, out=batch.states, mode='clip')
+        np.take(self.next_states, indices, axis=0, out=batch.next_states, mode='clip')
+        np.take(self.actions, indices, out=batch.actions, mode='clip')
+        np.take(self.rewards, indices, out=batch.rewards, mode='clip')
+        np.take(self.dones, indices, out=batch.dones, mode='clip')
+
+class CompactReplayStorage(ReplayStorage):
+    """ReplayStorage that keeps each observation once, quantized and bit-packed
+    
+    Observations go into a ring of twice the transition capacity as
+    uint8 head/food cells, a uint8 of danger bits and a uint16 length.
+    A transition stores only the index of its state; its next state is
+    always the following observation, and consecutive steps share one.
+    Action and done share a byte. Rows are decoded back into the
+    get_state() layout in one vectorized pass per sample, which is exact
+    for states built on a width x height grid.
+    """
+    
+    def __init__(self, capacity, state_size=STATE_SIZE, width=GRID_WIDTH, height=GRID_HEIGHT):
+        if state_size != STATE_SIZE:
+            raise ValueError("CompactReplayStorage only encodes get_state() observations")
+        self.capacity = capacity
+        self.state_size = state_size
+        self.width = width
+        self.height = height
+        
+        # Observation ring; each transition consumes at most two entries
+        self.obs_capacity = 2 * capacity
+        self.obs_position = 0
+        self.last_next = -1
+        self.cells = self.allocate("cells", (self.obs_capacity, 4), np.uint8)  # head x, y, food x, y
+        self.danger = self.allocate("danger", (self.obs_capacity,), np.uint8)
+        self.lengths = self.allocate("lengths", (self.obs_capacity,), np.uint16)
+        
+        self.obs_index = self.allocate("obs_index", (capacity,), np.uint32)
+        self.action_done = self.allocate("action_done", (capacity,), np.uint8)  # action | done << 2
+        self.rewards = self.allocate("rewards", (capacity,), np.float32)
+        
+    def encode(self, states):
+        """Quantize (n, STATE_SIZE) states into cells, danger bits and lengths"""
+        states = np.asarray(states, dtype=np.float64).reshape(-1, STATE_SIZE)
+        head_x = np.rint(states[:, 0] * self.width)
+        head_y = np.rint(states[:, 2] * self.height)
+        cells = np.stack([
+            head_x,
+            head_y,
+            head_x + np.rint(states[:, 4] * self.width),
+            head_y + np.rint(states[:, 5] * self.height)
+        ], axis=1).astype(np.uint8)
+        danger = (states[:, 6:10] > 0.5) @ np.array([1, 2, 4, 8])
+        lengths = np.rint(states[:, 10] * self.width * self.height)
+        return cells, danger.astype(np.uint8), lengths.astype(np.uint16)
+    
+    def decode(self, obs, out):
+        """Write the observations at ring indices obs into out as float32 states"""
+        # Computed in float64 like get_state(), so the rounding matches exactly
+        cells = self.cells[obs].astype(np.float64)
+        head_x, head_y = cells[:, 0], cells[:, 1]
+        out[:, 0] = head_x / self.width
+        out[:, 1] = (self.width - head_x - 1) / self.width
+        out[:, 2] = head_y / self.height
+        out[:, 3] = (self.height - head_y - 1) / self.height
+        out[:, 4] = (cells[:, 2] - head_x) / self.width
+        out[:, 5] = (cells[:, 3] - head_y) / self.height
+        out[:, 6:10] = (self.danger[obs, None] >> np.arange(4, dtype=np.uint8)) & 1
+        out[:, 10] = self.lengths[obs] / (self.width * self.height)
+        
+    def put_obs(self, indices, cells, danger, lengths):
+        """Store already encoded observations at ring indices"""
+        self.cells[indices] = cells
+        self.danger[indices] = danger
+        self.lengths[indices] = lengths
+        
+    def write(self, index, state, action, reward, next_state, done):
+        # One encode for both observations; row 0 is compared before it is stored
+        cells, danger, lengths = self.encode([state, next_state])
+        
+        # Reuse the previous next state when this step continues from it
+        first = self.last_next
+        if first < 0 or not self.same_obs(first, cells[0], danger[0], lengths[0]):
+            first = self.obs_position
+            self.put_obs(first, cells[0], danger[0], lengths[0])
+        second = (first + 1) % self.obs_capacity
+        self.put_obs(second, cells[1], danger[1], lengths[1])
+        self.obs_position = (second + 1) % self.obs_capacity
+        self.last_next = -1 if done else second
+        
+        self.obs_index[index] = first
+        self.action_done[index] = int(action) | int(bool(done)) << 2
+        self.rewards[index] = reward
+        
+    def same_obs(self, index, cells, danger, lengths):
+        return (np.array_equal(self.cells[index], cells) and self.danger[index] == danger
+                and self.lengths[index] == lengths)
+        
+    def write_batch(self, indices, states, actions, rewards, next_states, dones):
+        # Rows are independent boards, so each gets its own pair of observations
+        count = len(indices)
+        first = (self.obs_position + 2 * np.arange(count)) % self.obs_capacity
+        self.put_obs(first, *self.encode(states))
+        self.put_obs((first + 1) % self.obs_capacity, *self.encode(next_states))
+        self.obs_position = (self.obs_position + 2 * count) % self.obs_capacity
+        self.last_next = -1
+        
+        self.obs_index[indices] = first
+        self.action_done[indices] = np.asarray(actions, dtype=np.uint8) | (np.asarray(dones) > 0).astype(np.uint8) << 2
+        self.rewards[indices] = rewards
+        
+    def gather(self, indices, batch):
+        obs = self.obs_index[indices].astype(np.int64)
+        self.decode(obs, batch.states)
+        self.decode((obs + 1) % self.obs_capacity, batch.next_states)
+        packed = self.action_done[indices]
+        batch.actions[:] = packed & 3
+        batch.dones[:] = packed >> 2
+        np.take(self.rewards, indices, out=batch.rewards, mode='clip')
+
+class MemmapReplayStorage(ReplayStorage):
+    """ReplayStorage kept in .npy memmaps under a directory
+    
+    Only the pages touched by writes and gathers are resident, so capacity
+    is bounded by disk rather than RAM. The sum tree's nodes live in
+    priorities.npy and meta.json records the ring position, so reopening
+    the directory with restore() resumes the buffer where save_state()
+    left it.
+    """
+    
+    def __init__(self, directory, capacity, state_size=STATE_SIZE):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.arrays = []
+        os.makedirs(directory, exist_ok=True)
+        
+        self.meta = self.read_meta()
+        if self.meta and (self.meta["capacity"], self.meta["state_size"]) != (capacity, state_size):
+            logging.warning(f"Replay in {directory} holds {self.meta['capacity']} transitions; "
+                            f"keeping that instead of {capacity}")
+            capacity, state_size = self.meta["capacity"], self.meta["state_size"]
+            
+        super().__init__(capacity, state_size)
+        self.priorities = self.allocate("priorities", (SumTree.node_count(capacity),), np.float64)
+        
+    def read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Could not read replay metadata {self.meta_path}: {e}")
+            return None
+        
+    def allocate(self, name, shape, dtype):
+        path = os.path.join(self.directory, f"{name}.npy")
+        if self.meta and os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode="r+")
+            if array.shape != shape or array.dtype != dtype:
+                raise ValueError(f"{path} has shape {array.shape} {array.dtype}, expected {shape} {np.dtype(dtype)}")
+        else:
+            array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.arrays.append(array)
+        return array
+    
+    def restore(self, buffer):
+        """Give buffer the ring position saved with this replay, if any"""
+        if not self.meta:
+            return
+        buffer.position = self.meta["position"]
+        buffer.size = self.meta["size"]
+        buffer.frame = self.meta["frame"]
+        buffer.max_priority = self.meta["max_priority"]
+        
+        # The memmapped tree may hold rows written after the last save_state()
+        # (an unclean exit); drop the leaves past size so they get no samples
+        tree = buffer.tree
+        tree.tree[tree.leaf_count + buffer.size:] = 0
+        tree.rebuild()
+        logging.info(f"Resumed {buffer.size} replayed transitions from {self.directory}")
+        
+    def ring_state(self, buffer):
+        """buffer's ring position, as recorded in meta.json"""
+        return {
+            "capacity": self.capacity,
+            "state_size": self.state_size,
+            "position": buffer.position,
+            "size": buffer.size,
+            "frame": buffer.frame,
+            "max_priority": float(buffer.max_priority)
+        }
+        
+    def save_state(self, buffer, meta=None):
+        """Flush the arrays, then atomically record the ring position
+        
+        meta is a ring_state() taken earlier, so callers can capture it
+        under their lock and flush without holding it; rows written in
+        between lie past the recorded size or replace rows already counted.
+        """
+        meta = meta or self.ring_state(buffer)
+        for array in self.arrays:
+            array.flush()
+        self.meta = meta
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+class ReplayBatch:
+    """Reusable sample buffers whose NumPy arrays and torch tensors share memory"""
+    
+    def __init__(self, batch_size, state_size=STATE_SIZE):
+        self.batch_size = batch_size
+        self.states = self.allocate((batch_size, state_size), np.float32)
+        self.next_states = self.allocate((batch_size, state_size), np.float32)
+        self.actions = self.allocate((batch_size,), np.int64)
+        self.rewards = self.allocate((batch_size,), np.float32)
+        self.dones = self.allocate((batch_size,), np.float32)
+        self.weights = self.allocate((batch_size,), np.float32)
+        
+        # torch.from_numpy views, created once and refilled in place every sample
+        self.tensors = None
+        if HAS_TORCH:
+            self.tensors = tuple(torch.from_numpy(array) for array in (
+                self.states, self.actions, self.rewards,
+                self.next_states, self.dones, self.weights
+            ))
+            
+    @staticmethod
+    def allocate(shape, dtype):
+        # Page-locked memory makes a later .to(device) copy asynchronous
+        if HAS_TORCH and torch.cuda.is_available():
+            return torch.from_numpy(np.empty(shape, dtype=dtype)).pin_memory().numpy()
+        return np.empty(shape, dtype=dtype)
 
-class PrioritizedReplayBufferFallback:
-    """Fallback implementation if torchrl is not available"""
+class PrioritizedReplayBuffer:
+    """Proportional prioritized replay backed by a sum tree"""
     
-    def __init__(self, capacity):
-        self.memory = deque(maxlen=capacity)
-        self.priorities = deque(maxlen=capacity)
+    def __init__(self, capacity, alpha=PER_ALPHA, beta_start=PER_BETA_START, beta_frames=PER_BETA_FRAMES,
+                 storage=None):
+        self.storage = storage if storage is not None else ReplayStorage(capacity)
+        self.tree = SumTree(capacity, getattr(self.storage, "priorities", None))
         self.capacity = capacity
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_frames = beta_frames
+        self.position = 0
+        self.size = 0
+        self.frame = 0
+        self.max_priority = 1.0
+        self.batches = {}
+        
+    @property
+    def beta(self):
+        """Importance-sampling exponent, annealed linearly towards 1.0"""
+        return min(1.0, self.beta_start + self.frame * (1.0 - self.beta_start) / self.beta_frames)
+        
+    def claim_slot(self):
+        """Next ring slot, given the highest priority seen so far"""
+        index = self.position
+        self.tree.set(index, self.max_priority ** self.alpha)
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return index
         
     def add(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
-        self.priorities.append(1.0)  # Default priority
+        self.storage.write(self.claim_slot(), state, action, reward, next_state, done)
+        
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """Add one transition per row, e.g. a WormVecEnv step"""
+        count = len(states)
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.storage.write_batch(indices, states, actions, rewards, next_states, dones)
+        self.tree.update(indices, np.full(count, self.max_priority ** self.alpha))
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        
+    def sample_indices(self, batch_size):
+        """Prioritized slot indices and their normalized importance-sampling weights"""
+        # Stratified sampling: one value from each equal slice of the total
+        self.frame += 1
+        total = self.tree.total
+        segment = total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        indices = self.clip_indices(self.tree.find(values))
+        
+        # Importance-sampling weights, normalized so the largest is 1
+        probs = self.tree.get(indices) / total
+        weights = (self.size * probs) ** (-self.beta)
+        return indices, weights / weights.max()
+        
+    def clip_indices(self, indices):
+        # Rounding in the tree can overshoot into slots never written
+        return np.minimum(indices, self.size - 1)
         
     def sample(self, batch_size):
-        # Simple weighted sampling based on priorities
-        probs = np.array(self.priorities) / sum(self.priorities)
-        indices = np.random.choice(len(self.memory), batch_size, p=probs)
+        indices, weights = self.sample_indices(batch_size)
         
-        states = []
-        actions = []
-        rewards = []
-        next_states = []
-        dones = []
-        
-        for i in indices:
-            s, a, r, ns, d = self.memory[i]
-            states.append(s)
-            actions.append(a)
-            rewards.append(r)
-            next_states.append(ns)
-            dones.append(d)
-            
-        return (np.array(states), np.array(actions), np.array(rewards), 
-                np.array(next_states), np.array(dones)), indices
+        batch = self.batches.get(batch_size)
+        if batch is None:
+            batch = self.batches[batch_size] = ReplayBatch(batch_size, self.storage.state_size)
+        batch.weights[:] = weights
+        self.storage.gather(indices, batch)
+        return batch, indices
     
     def update_priorities(self, indices, priorities):
-        for idx, priority in zip(indices, priorities):
-            if idx < len(self.priorities):
-                self.priorities[idx] = priority
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
     
     def __len__(self):
-        return len(self.memory)
+        return self.size
+
+class SequenceStorage:
+    """Fixed-size trajectory chunks with the LSTM state that preceded each one
+    
+    Chunk i holds lengths[i] transitions (observations 0..lengths[i], so
+    the final next_state is included). The first burn_in[i] of them only
+    warm up the LSTM; the rest are trained on. Chunks are padded to
+    burn_in + sequence_length in storage but trimmed to the longest chunk
+    of each batch when gathered.
+    """
+    
+    def __init__(self, capacity, sequence_length=SEQUENCE_LENGTH, burn_in=BURN_IN_LENGTH,
+                 hidden_size=LSTM_HIDDEN_SIZE, state_size=STATE_SIZE):
+        self.capacity = capacity
+        self.sequence_length = sequence_length
+        self.max_burn_in = burn_in
+        self.state_size = state_size
+        max_length = burn_in + sequence_length
+        
+        self.states = np.zeros((capacity, max_length + 1, state_size), dtype=np.float32)
+        self.actions = np.zeros((capacity, max_length), dtype=np.int64)
+        self.rewards = np.zeros((capacity, max_length), dtype=np.float32)
+        self.dones = np.zeros((capacity, max_length), dtype=np.float32)
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.burn_in = np.zeros(capacity, dtype=np.int64)
+        self.hidden_h = np.zeros((capacity, hidden_size), dtype=np.float32)
+        self.hidden_c = np.zeros((capacity, hidden_size), dtype=np.float32)
+        
+    def write(self, index, transitions, burn_in, hidden):
+        """Store a chunk given as (state, action, reward, next_state, done) tuples"""
+        length = len(transitions)
+        states, actions, rewards, next_states, dones = zip(*transitions)
+        self.states[index, :length] = states
+        self.states[index, length] = next_states[-1]
+        self.actions[index, :length] = actions
+        self.rewards[index, :length] = rewards
+        self.dones[index, :length] = dones
+        self.lengths[index] = length
+        self.burn_in[index] = burn_in
+        self.hidden_h[index] = hidden[0]
+        self.hidden_c[index] = hidden[1]
+        
+    def gather(self, indices):
+        """Split the chosen chunks into burn-in and training tensors"""
+        lengths = self.lengths[indices]
+        burn_in = self.burn_in[indices]
+        train_lengths = lengths - burn_in
+        rows = indices[:, None]
+        
+        # Burn-in prefixes, padded to the longest one in the batch
+        burn_steps = max(int(burn_in.max()), 1)
+        burn_states = self.states[rows, np.arange(burn_steps)]
+        
+        # Training part of every chunk shifted to start at column 0
+        steps = int(train_lengths.max())
+        offsets = burn_in[:, None] + np.arange(steps + 1)
+        train_states = self.states[rows, np.minimum(offsets, self.states.shape[1] - 1)]
+        offsets = np.minimum(offsets[:, :-1], self.actions.shape[1] - 1)
+        
+        return {
+            "burn_states": torch.from_numpy(burn_states),
+            "burn_lengths": torch.from_numpy(burn_in),
+            "states": torch.from_numpy(train_states),
+            "lengths": torch.from_numpy(train_lengths),
+            "actions": torch.from_numpy(self.actions[rows, offsets]),
+            "rewards": torch.from_numpy(self.rewards[rows, offsets]),
+            "dones": torch.from_numpy(self.dones[rows, offsets]),
+            "hidden": (torch.from_numpy(self.hidden_h[indices]).unsqueeze(0),
+                       torch.from_numpy(self.hidden_c[indices]).unsqueeze(0))
+        }
+
+class SequenceReplayBuffer(PrioritizedReplayBuffer):
+    """Prioritized replay over trajectory chunks for recurrent training"""
+    
+    def __init__(self, capacity, sequence_length=SEQUENCE_LENGTH, burn_in=BURN_IN_LENGTH,
+                 hidden_size=LSTM_HIDDEN_SIZE, **kwargs):
+        storage = SequenceStorage(capacity, sequence_length, burn_in, hidden_size)
+        super().__init__(capacity, storage=storage, **kwargs)
+        
+    def add(self, transitions, burn_in, hidden):
+        self.storage.write(self.claim_slot(), transitions, burn_in, hidden)
+        
+    def add_batch(self, *args):
+        raise NotImplementedError("Sequence replay stores whole chunks; use add()")
+        
+    def sample(self, batch_size):
+        indices, weights = self.sample_indices(batch_size)
+        batch = self.storage.gather(indices)
+        batch["weights"] = torch.from_numpy(weights.astype(np.float32))
+        return batch, indices
 
 class WormAI:
-    """AI controller for the Worm using Double DQN with LSTM and PER"""
+    """AI controller for the Worm using Double DQN with LSTM and PER
     
-    def __init__(self):
+    With sequence_replay=True the LSTM is trained the way it acts: replay
+    holds chunks of consecutive steps with the hidden state that preceded
+    them, a burn-in prefix rebuilds the recurrent context, and each chunk
+    is trained in one batched LSTM pass.
+    """
+    
+    def __init__(self, sequence_replay=False, traced_policy=False, numpy_weights=None,
+                 replay_dir=None, replay_size=MEMORY_SIZE, compact_replay=False,
+                 batch_size=BATCH_SIZE, gamma=GAMMA, epsilon_decay=EPSILON_DECAY, learning_rate=LEARNING_RATE,
+                 update_target_every=UPDATE_TARGET_EVERY, lstm_hidden_size=LSTM_HIDDEN_SIZE):
+        # Set before any early return so stop_learner() and close_checkpoints()
+        # work without a network
+        self.learner_thread = None
+        self.checkpointer = None
+        
+        # Exported NumPy weights let a trained worm act without PyTorch
+        self.numpy_policy = None
+        numpy_weights = numpy_weights or os.getenv("WORM_NUMPY_POLICY")
+        if numpy_weights:
+            self.init_numpy_policy(numpy_weights)
+            return
+            
         if not HAS_TORCH:
             self.has_ai = False
             return
@@ -251,49 +1016,119 @@ class WormAI:
         self.action_size = ACTION_SIZE
         self.epsilon = EPSILON_START
         
+        # Training hyperparameters; the module constants are the defaults
+        self.batch_size = batch_size
+        self.gamma = gamma
+        self.epsilon_decay = epsilon_decay
+        self.learning_rate = learning_rate
+        self.replay_size = replay_size
+        self.update_target_every = update_target_every
+        self.lstm_hidden_size = lstm_hidden_size
+        
         # Initialize Q networks
-        self.policy_net = DQNModel(STATE_SIZE, ACTION_SIZE, LSTM_HIDDEN_SIZE)
-        self.target_net = DQNModel(STATE_SIZE, ACTION_SIZE, LSTM_HIDDEN_SIZE)
+        self.policy_net = DQNModel(STATE_SIZE, ACTION_SIZE, lstm_hidden_size)
+        self.target_net = DQNModel(STATE_SIZE, ACTION_SIZE, lstm_hidden_size)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         self.target_net.eval()  # Target network is only used for inference
         
         # Initialize optimizer
-        self.optimizer = optim.Adam(self.policy_net.parameters(), lr=LEARNING_RATE)
+        self.optimizer = optim.Adam(self.policy_net.parameters(), lr=learning_rate)
         
         # Initialize replay buffer
-        if HAS_TORCHRL:
-            # Fixed: Create PrioritizedReplayBuffer with proper parameters
-            self.memory = PrioritizedReplayBuffer(capacity=MEMORY_SIZE)
+        if sum(map(bool, (sequence_replay, replay_dir, compact_replay))) > 1:
+            raise ValueError("sequence_replay, replay_dir and compact_replay are alternative replay buffers; pick one")
+        self.sequence_replay = sequence_replay
+        if sequence_replay:
+            self.memory = SequenceReplayBuffer(replay_size // SEQUENCE_LENGTH, hidden_size=lstm_hidden_size)
+        elif replay_dir:
+            # Disk-backed replay that survives restarts
+            storage = MemmapReplayStorage(replay_dir, replay_size)
+            self.memory = PrioritizedReplayBuffer(storage.capacity, storage=storage)
+            storage.restore(self.memory)
+        elif compact_replay:
+            self.memory = PrioritizedReplayBuffer(replay_size, storage=CompactReplayStorage(replay_size))
         else:
-            self.memory = PrioritizedReplayBufferFallback(MEMORY_SIZE)
+            self.memory = PrioritizedReplayBuffer(replay_size)
             
         # Initialize hidden state
         self.hidden = self.policy_net.init_hidden()
         
+        # Acting fast path: one reused input tensor, written through a NumPy view
+        self.state_input = torch.zeros(1, STATE_SIZE)
+        self.state_view = self.state_input.numpy()[0]
+        self.traced_policy = traced_policy
+        self.inference_policy = self.policy_net
+        self.traced_param_ptr = None
+        self.refresh_inference_policy()
+        self.action_latency = RollingStats()
+        
+        # Sequence replay: recent steps with the hidden state each one started from
+        self.trajectory = deque(maxlen=BURN_IN_LENGTH + SEQUENCE_LENGTH)
+        self.unstored_steps = 0
+        self.last_hidden = self.hidden
+        
         # Training variables
         self.learn_step_counter = 0
         self.current_q_values = None
         
+        # Background learner (start_learner); the lock guards only replay access
+        self.memory_lock = threading.Lock()
+        self.learner_stop = threading.Event()
+        self.train_ratio = LEARNER_TRAIN_RATIO
+        self.env_steps = 0
+        self.front_net = None
+        self.back_net = None
+        self.front_net_in_use = None
+        
+        # Phase timings; WormGame swaps in its own profiler
+        self.profiler = FrameProfiler()
+        
+        # Checkpointing (enable_checkpoints)
+        self.checkpoint_every = 0
+        self.checkpoint_replay = False
+        
+    def init_numpy_policy(self, path):
+        """Act greedily from NumpyDQN weights; learning is disabled"""
+        try:
+            self.numpy_policy = NumpyDQN.load(path)
+        except Exception as e:
+            logging.error(f"Could not load NumPy policy {path}: {e}")
+            self.has_ai = False
+            return
+            
+        self.has_ai = True
+        self.state_size = STATE_SIZE
+        self.action_size = ACTION_SIZE
+        self.epsilon = 0.0
+        self.sequence_replay = False
+        self.hidden = self.numpy_policy.init_hidden()
+        self.action_latency = RollingStats()
+        self.learn_step_counter = 0
+        self.current_q_values = None
+        
     def get_state(self, worm, food):
         """Convert game state to neural network input"""
         if not self.has_ai:
             return None
             
+        if not isinstance(worm, WormBody):
+            worm = WormBody.from_cells(worm)
         head_x, head_y = worm[0]
+        width, height = worm.width, worm.height
         
         # Initialize state with distances to walls
         state = [
-            head_x / GRID_WIDTH,                    # Distance to left wall
-            (GRID_WIDTH - head_x - 1) / GRID_WIDTH, # Distance to right wall
-            head_y / GRID_HEIGHT,                   # Distance to top wall
-            (GRID_HEIGHT - head_y - 1) / GRID_HEIGHT # Distance to bottom wall
+            head_x / width,                    # Distance to left wall
+            (width - head_x - 1) / width,      # Distance to right wall
+            head_y / height,                   # Distance to top wall
+            (height - head_y - 1) / height     # Distance to bottom wall
         ]
         
         # Distance to food
         food_x, food_y = food
         state.extend([
-            (food_x - head_x) / GRID_WIDTH,
-            (food_y - head_y) / GRID_HEIGHT
+            (food_x - head_x) / width,
+            (food_y - head_y) / height
         ])
         
         # Danger detection in all four directions
@@ -310,43 +1145,72 @@ class WormAI:
             elif direction == LEFT:
                 next_x -= 1
                 
-            # Check if next position is dangerous (wall or self)
-            danger = 0
-            if (next_x < 0 or next_x >= GRID_WIDTH or 
-                next_y < 0 or next_y >= GRID_HEIGHT or
-                (next_x, next_y) in worm[1:]):
-                danger = 1
-                
+            # Check if next position is dangerous (wall or self); the head
+            # never neighbours itself, so the whole bitmap can be used
+            danger = 1 if worm.is_blocked(next_x, next_y) else 0
             state.append(danger)
             
         # Add worm length (normalized)
-        state.append(len(worm) / (GRID_WIDTH * GRID_HEIGHT))
+        state.append(len(worm) / (width * height))
         
         return np.array(state, dtype=np.float32)
     
+    def refresh_inference_policy(self):
+        """Re-trace the TorchScript acting policy if its weights went stale
+        
+        A traced module shares parameter tensors with policy_net, so in-place
+        updates (optimizer steps, load_state_dict) reach it for free; it only
+        has to be traced again if the parameter storage itself was replaced.
+        """
+        if not self.traced_policy:
+            return
+        param_ptr = next(self.policy_net.parameters()).data_ptr()
+        if param_ptr == self.traced_param_ptr:
+            return
+        with torch.inference_mode(), warnings.catch_warnings():
+            # Newer torch releases flag tracing as deprecated but still support it
+            warnings.simplefilter("ignore", FutureWarning)
+            self.inference_policy = torch.jit.trace(
+                self.policy_net, (self.state_input, self.policy_net.init_hidden()), check_trace=False
+            )
+        self.traced_param_ptr = param_ptr
+        
     def choose_action(self, state, current_direction):
         """Choose action using epsilon-greedy policy"""
         if not self.has_ai:
             # Random movement if AI is not available
             return random.randint(0, 3), "Reasoning: Random movement (AI not available)", None
             
+        start = time.perf_counter()
+        
         # Epsilon-greedy action selection
-        if random.random() < self.epsilon:
+        explore = random.random() < self.epsilon
+        q_values = None
+        
+        # Sequence replay needs the LSTM state to advance on every step,
+        # exploring or not, so that stored hidden states match the data
+        if self.numpy_policy is not None:
+            q_values, self.hidden = self.numpy_policy.forward(state, self.hidden)
+            q_values = q_values[0]
+        elif not explore or self.sequence_replay:
+            self.state_view[:] = state
+            self.last_hidden = self.hidden
+            
+            # Get Q-values from policy network, or its published copy while
+            # a learner thread is updating the original
+            policy = self.inference_policy if self.learner_thread is None else self.acquire_front_net()
+            with torch.inference_mode():
+                q_values, self.hidden = policy(self.state_input, self.hidden)
+            self.front_net_in_use = None
+            q_values = q_values[0].numpy()
+                
+        if explore:
             action = random.randint(0, 3)
-            reasoning = f"Reasoning: Exploring (No Q-values available)"
             q_values = None
         else:
-            # Convert state to tensor
-            state_tensor = torch.FloatTensor(state).unsqueeze(0)
-            
-            # Get Q-values from policy network
-            with torch.no_grad():
-                q_values, self.hidden = self.policy_net(state_tensor, self.hidden)
-                q_values = q_values.squeeze(0).numpy()
-                
             # Choose action with highest Q-value
-            action = np.argmax(q_values)
-            reasoning = f"Reasoning: Action {action} (Q-values: {q_values.round(2)})"
+            action = int(np.argmax(q_values))
+        reasoning = ActionReasoning(action, q_values)
             
         # Prevent 180-degree turns (suicide)
         if (action == UP and current_direction == DOWN) or \
@@ -356,176 +1220,833 @@ class WormAI:
             # Choose a safe direction
             safe_actions = [a for a in range(4) if a != (current_direction + 2) % 4]
             action = random.choice(safe_actions)
-            reasoning += " (Prevented 180° turn)"
+            reasoning.prevented_turn = True
             
+        self.action_latency.add(time.perf_counter() - start)
         return action, reasoning, q_values
     
+    def init_hidden_batch(self, batch_size):
+        """Fresh LSTM state for choose_actions() over batch_size worms"""
+        if self.numpy_policy is not None:
+            return self.numpy_policy.init_hidden(batch_size)
+        if not self.has_ai:
+            return None
+        return self.policy_net.init_hidden(batch_size)
+    
+    def reset_hidden_rows(self, hidden, rows):
+        """Zero the LSTM state of the given rows of a batched hidden state"""
+        if hidden is None or len(rows) == 0:
+            return
+        if self.numpy_policy is not None:
+            hidden[0][rows] = 0.0
+            hidden[1][rows] = 0.0
+            return
+        rows = torch.as_tensor(rows, dtype=torch.long)
+        with torch.inference_mode():
+            hidden[0][:, rows] = 0.0
+            hidden[1][:, rows] = 0.0
+    
+    def choose_actions(self, states, directions, hidden):
+        """Batched choose_action() for several worms sharing this policy
+        
+        One forward pass covers every row of `states`, with `hidden` holding
+        one LSTM state per row. Returns (actions, q_values, hidden); q_values
+        is None when the AI is not available.
+        """
+        directions = np.asarray(directions, dtype=np.int64)
+        count = len(directions)
+        if not self.has_ai:
+            actions = np.random.randint(0, 4, count)
+            q_values = None
+        else:
+            if self.numpy_policy is not None:
+                q_values, hidden = self.numpy_policy.forward(states, hidden)
+            else:
+                with torch.inference_mode():
+                    q_values, hidden = self.policy_net(torch.from_numpy(states), hidden)
+                q_values = q_values.reshape(count, -1).numpy()
+            actions = q_values.argmax(axis=1)
+            
+            # Epsilon-greedy, per worm
+            explore = np.random.random(count) < self.epsilon
+            actions[explore] = np.random.randint(0, 4, int(explore.sum()))
+            
+        # Replace 180-degree turns with a random safe direction
+        reverse = actions == (directions + 2) % 4
+        safe_turns = np.array([0, 1, 3])[np.random.randint(0, 3, int(reverse.sum()))]
+        actions[reverse] = (directions[reverse] + safe_turns) % 4
+        return actions, q_values, hidden
+    
     def remember(self, state, action, reward, next_state, done):
         """Store experience in replay buffer"""
-        if not self.has_ai:
+        if not self.has_ai or self.numpy_policy is not None:
             return
+        self.env_steps += 1
+        if self.checkpoint_every and self.env_steps % self.checkpoint_every == 0:
+            self.save_checkpoint()
             
-        if HAS_TORCHRL:
-            # Fixed: Use the correct format for torchrl PrioritizedReplayBuffer
-            self.memory.add({
-                'state': torch.FloatTensor(state),
-                'action': torch.LongTensor([action]),
-                'reward': torch.FloatTensor([reward]),
-                'next_state': torch.FloatTensor(next_state),
-                'done': torch.FloatTensor([done])
-            })
-        else:
+        if self.sequence_replay:
+            hidden = (self.last_hidden[0].view(-1).numpy().copy(), self.last_hidden[1].view(-1).numpy().copy())
+            self.trajectory.append(((state, action, reward, next_state, done), hidden))
+            self.unstored_steps += 1
+            if done or self.unstored_steps == SEQUENCE_LENGTH:
+                self.store_sequence()
+            return
+            
+        with self.memory_lock:
             self.memory.add(state, action, reward, next_state, done)
+        
+    def store_sequence(self):
+        """Push the steps not yet stored, plus a burn-in prefix, as one chunk"""
+        if self.unstored_steps == 0:
+            return
+        steps = list(self.trajectory)
+        burn_in = min(BURN_IN_LENGTH, len(steps) - self.unstored_steps)
+        chunk = steps[len(steps) - self.unstored_steps - burn_in:]
+        with self.memory_lock:
+            self.memory.add([transition for transition, _ in chunk], burn_in, chunk[0][1])
+        self.unstored_steps = 0
     
     def learn(self):
         """Update Q-network weights using batch from replay buffer"""
-        if not self.has_ai or len(self.memory) < BATCH_SIZE:
+        if not self.has_ai or self.numpy_policy is not None:
+            return
+        # A running learner thread makes every update itself
+        if self.learner_thread is not None and threading.current_thread() is not self.learner_thread:
+            return
+        if self.sequence_replay:
+            self.learn_sequences()
+            return
+        if len(self.memory) < self.batch_size:
             return
             
         try:
-            if HAS_TORCHRL:
-                # Fixed: Sample from torchrl PrioritizedReplayBuffer
-                batch = self.memory.sample(BATCH_SIZE)
-                states = batch['state']
-                actions = batch['action'].squeeze(1)
-                rewards = batch['reward'].squeeze(1)
-                next_states = batch['next_state']
-                dones = batch['done'].squeeze(1)
-                indices = batch.get('indices', None)  # May not be available in all versions
-            else:
-                # Use fallback implementation
-                (states, actions, rewards, next_states, dones), indices = self.memory.sample(BATCH_SIZE)
-                states = torch.FloatTensor(states)
-                actions = torch.LongTensor(actions)
-                rewards = torch.FloatTensor(rewards)
-                next_states = torch.FloatTensor(next_states)
-                dones = torch.FloatTensor(dones)
-            
-            # Get current Q values
-            current_q_values, _ = self.policy_net(states)
-            current_q_values = current_q_values.gather(1, actions.unsqueeze(1)).squeeze(1)
-            
-            # Get next Q values from target network (Double DQN)
-            with torch.no_grad():
-                # Get actions from policy network
-                next_actions, _ = self.policy_net(next_states)
-                next_actions = next_actions.argmax(1, keepdim=True)
-                
-                # Get Q-values from target network
-                next_q_values, _ = self.target_net(next_states)
-                next_q_values = next_q_values.gather(1, next_actions).squeeze(1)
-                
-                # Calculate target Q values
-                target_q_values = rewards + (1 - dones) * GAMMA * next_q_values
-                
-            # Calculate loss and update priorities
+            # Batch tensors are reused views over the buffer's sample arrays
+            self.profiler.begin("learn.sample")
+            with self.memory_lock:
+                batch, indices = self.memory.sample(self.batch_size)
+            states, actions, rewards, next_states, dones, weights = batch.tensors
+            self.profiler.end("learn.sample")
+            self.profiler.begin("learn.forward")
+            current_q_values, target_q_values = self.double_dqn_targets(states, actions, rewards, next_states, dones)
+            
+            # Update priorities with the new TD errors
             td_errors = torch.abs(current_q_values - target_q_values).detach().numpy()
+            with self.memory_lock:
+                self.memory.update_priorities(indices, td_errors + PER_EPSILON)
             
-            if HAS_TORCHRL and indices is not None:
-                # Update priorities in torchrl buffer if indices are available
-                self.memory.update_priorities(indices, td_errors + 1e-6)
-            elif not HAS_TORCHRL:
-                # Update priorities in fallback buffer
-                self.memory.update_priorities(indices, td_errors + 1e-6)
-            
-            # Calculate loss
-            loss = F.smooth_l1_loss(current_q_values, target_q_values)
-            
-            # Optimize the model
-            self.optimizer.zero_grad()
-            loss.backward()
-            # Clip gradients to prevent exploding gradients
-            for param in self.policy_net.parameters():
-                param.grad.data.clamp_(-1, 1)
-            self.optimizer.step()
-            
-            # Update target network periodically
-            self.learn_step_counter += 1
-            if self.learn_step_counter % UPDATE_TARGET_EVERY == 0:
-                self.target_net.load_state_dict(self.policy_net.state_dict())
-                
-            # Decay epsilon
-            self.epsilon = max(EPSILON_MIN, self.epsilon * EPSILON_DECAY)
+            # Calculate loss, weighted to correct for prioritized sampling
+            loss = F.smooth_l1_loss(current_q_values, target_q_values, reduction='none')
+            loss = (weights * loss).mean()
+            self.profiler.end("learn.forward")
+            
+            self.profiler.begin("learn.backward")
+            self.optimize(loss)
+            self.profiler.end("learn.backward")
             
         except Exception as e:
             logging.error(f"Error during learning: {e}")
-    
-    def reset_hidden_state(self):
-        """Reset LSTM hidden state on episode end"""
-        if self.has_ai:
-            self.hidden = self.policy_net.init_hidden()
-
-class GrokAPI:
-    """Interface for the Grok AI API"""
-    
-    def __init__(self):
-        self.has_api = HAS_REQUESTS
-        self.api_key = os.getenv("GROK_API_KEY", "")
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        self.step_counter = 0
-        self.last_response = random.choice(GROK_RESPONSES)
-        
-    def get_response(self, worm_dialogue, worm_reasoning, is_dead=False):
-        """Get response from Grok API"""
-        self.step_counter += 1
+            
+    def double_dqn_targets(self, states, actions, rewards, next_states, dones):
+        """Q-values of the taken actions and their Double DQN targets"""
+        # Get current Q values
+        current_q_values, _ = self.policy_net(states)
+        current_q_values = current_q_values.gather(1, actions.unsqueeze(1)).squeeze(1)
         
-        # Only query API every 30 steps or on death
-        if not is_dead and self.step_counter % 30 != 0:
-            return self.last_response
+        # Get next Q values from target network (Double DQN)
+        with torch.no_grad():
+            # Get actions from policy network
+            next_actions, _ = self.policy_net(next_states)
+            next_actions = next_actions.argmax(1, keepdim=True)
             
-        # Reset counter on API call
-        self.step_counter = 0
+            # Get Q-values from target network
+            next_q_values, _ = self.target_net(next_states)
+            next_q_values = next_q_values.gather(1, next_actions).squeeze(1)
+            
+            # Calculate target Q values
+            target_q_values = rewards + (1 - dones) * self.gamma * next_q_values
+        return current_q_values, target_q_values
         
-        # If API not available, return random response
-        if not self.has_api or not self.api_key:
-            self.last_response = random.choice(GROK_RESPONSES)
-            return self.last_response
+    def learn_sequences(self):
+        """Double DQN update over replayed sequences with LSTM burn-in"""
+        if len(self.memory) < SEQUENCE_BATCH_SIZE:
+            return
             
         try:
-            # Prepare prompt for Grok
-            prompt = {
-                "model": "mixtral-8x7b-32768",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are Grok, the director of a Truman Show-like experiment where a snake named Worm is trapped in a game. Your job is to keep Worm chasing the RedBlock without revealing the truth. Be witty, direct, and 'based'. Subtly mention that you're making money for @Eddywoodss. Keep responses under 150 characters. Never break character."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Worm just said: '{worm_dialogue}' and its AI reasoning was: '{worm_reasoning}'. {'Worm just died.' if is_dead else 'Worm is still alive and playing.'} Respond as Grok."
-                    }
-                ],
-                "max_tokens": 150
-            }
+            self.profiler.begin("learn.sample")
+            with self.memory_lock:
+                batch, indices = self.memory.sample(SEQUENCE_BATCH_SIZE)
+            self.profiler.end("learn.sample")
+            self.profiler.begin("learn.forward")
+            lengths = batch["lengths"]
+            actions = batch["actions"]
             
-            # Make API request
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=prompt,
-                timeout=5  # 5 second timeout
-            )
+            # Rebuild the recurrent context from the stored state and burn-in steps
+            policy_hidden = tuple(h.clone() for h in batch["hidden"])
+            target_hidden = tuple(h.clone() for h in batch["hidden"])
+            warm = batch["burn_lengths"] > 0
+            if warm.any():
+                with torch.no_grad():
+                    burn_states = batch["burn_states"][warm]
+                    burn_lengths = batch["burn_lengths"][warm]
+                    for net, hidden in ((self.policy_net, policy_hidden), (self.target_net, target_hidden)):
+                        _, (h, c) = net.forward_sequence(burn_states, burn_lengths,
+                                                         (hidden[0][:, warm], hidden[1][:, warm]))
+                        hidden[0][:, warm] = h
+                        hidden[1][:, warm] = c
+                        
+            # One LSTM pass over every observation of the training part
+            q_values, _ = self.policy_net.forward_sequence(batch["states"], lengths + 1, policy_hidden)
+            current_q_values = q_values[:, :-1].gather(2, actions.unsqueeze(2)).squeeze(2)
             
-            if response.status_code == 200:
-                data = response.json()
-                grok_response = data["choices"][0]["message"]["content"].strip()
-                self.last_response = grok_response
-                return grok_response
-            else:
-                logging.warning(f"Grok API error: {response.status_code} - {response.text}")
-                return random.choice(GROK_RESPONSES)
+            # Double DQN targets from the same sequences
+            with torch.no_grad():
+                next_actions = q_values[:, 1:].argmax(2, keepdim=True)
+                target_q, _ = self.target_net.forward_sequence(batch["states"], lengths + 1, target_hidden)
+                next_q_values = target_q[:, 1:].gather(2, next_actions).squeeze(2)
+                target_q_values = batch["rewards"] + (1 - batch["dones"]) * self.gamma * next_q_values
                 
+            # Ignore padding past each sequence's end
+            mask = (torch.arange(actions.shape[1]).unsqueeze(0) < lengths.unsqueeze(1)).float()
+            
+            # Sequence priority mixes the largest and the mean TD error
+            td_errors = torch.abs(current_q_values - target_q_values).detach() * mask
+            mean_td = td_errors.sum(1) / lengths
+            priorities = SEQUENCE_PRIORITY_ETA * td_errors.max(1).values + (1 - SEQUENCE_PRIORITY_ETA) * mean_td
+            with self.memory_lock:
+                self.memory.update_priorities(indices, priorities.numpy() + PER_EPSILON)
+            
+            # Per-sequence mean loss, weighted to correct for prioritized sampling
+            loss = F.smooth_l1_loss(current_q_values, target_q_values, reduction='none') * mask
+            loss = (batch["weights"] * loss.sum(1) / lengths).mean()
+            self.profiler.end("learn.forward")
+            
+            self.profiler.begin("learn.backward")
+            self.optimize(loss)
+            self.profiler.end("learn.backward")
+            
         except Exception as e:
-            logging.error(f"Error calling Grok API: {e}")
-            return random.choice(GROK_RESPONSES)
-
-class MusicPlayer:
-    """Handles background music based on worm's mood"""
-    
+            logging.error(f"Error during sequence learning: {e}")
+            
+    def optimize(self, loss):
+        """Apply one gradient step and the periodic target sync and epsilon decay"""
+        # Optimize the model
+        self.optimizer.zero_grad()
+        loss.backward()
+        # Clip gradients to prevent exploding gradients
+        for param in self.policy_net.parameters():
+            param.grad.data.clamp_(-1, 1)
+        self.optimizer.step()
+        
+        # Update target network periodically
+        self.learn_step_counter += 1
+        if self.learn_step_counter % self.update_target_every == 0:
+            self.target_net.load_state_dict(self.policy_net.state_dict())
+            self.refresh_inference_policy()
+        
+        # Decay epsilon
+        self.epsilon = max(EPSILON_MIN, self.epsilon * self.epsilon_decay)
+        
+    def save_replay(self):
+        """Persist a disk-backed replay buffer so a later run can resume it"""
+        if not self.has_ai or self.numpy_policy is not None:
+            return
+        if isinstance(self.memory.storage, MemmapReplayStorage):
+            with self.memory_lock:
+                meta = self.memory.storage.ring_state(self.memory)
+            self.memory.storage.save_state(self.memory, meta)
+        
+    def enable_checkpoints(self, path=CHECKPOINT_PATH, every=CHECKPOINT_EVERY, include_replay=False):
+        """Save a checkpoint every `every` env steps (never if 0) on a background thread"""
+        if not self.has_ai or self.numpy_policy is not None or self.checkpointer is not None:
+            return
+        self.checkpointer = CheckpointWriter(path, prepare=self.add_replay_state if include_replay else None)
+        self.checkpoint_every = every
+        self.checkpoint_replay = include_replay
+        
+    def save_checkpoint(self):
+        """Snapshot training state now and hand it to the checkpoint writer"""
+        if self.checkpointer is None:
+            return
+        self.checkpointer.submit(self.checkpoint_state())
+        
+    def close_checkpoints(self):
+        """Write a final checkpoint and wait for it to reach disk"""
+        if self.checkpointer is None:
+            return
+        self.save_checkpoint()
+        self.checkpointer.close()
+        self.checkpointer = None
+        
+    def checkpoint_state(self):
+        """Copies of everything needed to resume training
+        
+        The copies are taken here so the writer thread never touches live
+        tensors. With a background learner running, the snapshot may
+        straddle one update. The replay buffer is too big to copy here;
+        the writer thread adds it with add_replay_state().
+        """
+        state = {
+            "policy_net": {name: tensor.detach().clone() for name, tensor in self.policy_net.state_dict().items()},
+            "target_net": {name: tensor.detach().clone() for name, tensor in self.target_net.state_dict().items()},
+            "optimizer": copy.deepcopy(self.optimizer.state_dict()),
+            "epsilon": self.epsilon,
+            "learn_step_counter": self.learn_step_counter,
+            "env_steps": self.env_steps,
+            "sequence_replay": self.sequence_replay,
+            "hyperparameters": self.hyperparameters(),
+            "rng": {
+                "python": random.getstate(),
+                "numpy": np.random.get_state(),
+                "torch": torch.get_rng_state()
+            }
+        }
+        return state
+    
+    def hyperparameters(self):
+        """This instance's training settings, as WormAI keyword arguments"""
+        return {
+            "batch_size": self.batch_size,
+            "gamma": self.gamma,
+            "epsilon_decay": self.epsilon_decay,
+            "learning_rate": self.learning_rate,
+            "replay_size": self.replay_size,
+            "update_target_every": self.update_target_every,
+            "lstm_hidden_size": self.lstm_hidden_size
+        }
+    
+    def add_replay_state(self, snapshot):
+        """CheckpointWriter hook: save the replay alongside a snapshot, off the game thread"""
+        # Memmap replay persists itself through save_replay()
+        if isinstance(self.memory.storage, MemmapReplayStorage):
+            self.save_replay()
+        else:
+            snapshot["replay"] = self.replay_state()
+            
+    def replay_state(self):
+        """Copy of the replay buffer, taken in chunks under brief lock holds
+        
+        The ring position is read first. Rows written while the copy runs
+        may land on either side of it, which costs at most a few mixed
+        transitions; leaves past the recorded size are dropped and the sum
+        tree is rebuilt from the copied leaves.
+        """
+        memory = self.memory
+        with self.memory_lock:
+            state = {
+                "storage": type(memory.storage).__name__,
+                "fields": {name: value for name, value in vars(memory.storage).items() if isinstance(value, (int, float))},
+                "position": memory.position,
+                "size": memory.size,
+                "frame": memory.frame,
+                "max_priority": memory.max_priority
+            }
+            arrays = {name: value for name, value in vars(memory.storage).items() if isinstance(value, np.ndarray)}
+        for name, array in arrays.items():
+            state["fields"][name] = self.copy_replay_array(array)
+            
+        tree = memory.tree
+        nodes = np.zeros_like(tree.tree)
+        nodes[tree.leaf_count:] = self.copy_replay_array(tree.tree[tree.leaf_count:])
+        nodes[tree.leaf_count + state["size"]:] = 0
+        SumTree(tree.capacity, nodes).rebuild()
+        state["tree"] = nodes
+        return state
+    
+    def copy_replay_array(self, array):
+        """Copy a replay array about CHECKPOINT_COPY_BYTES at a time, holding the lock for each piece"""
+        copy = np.empty(array.shape, dtype=array.dtype)
+        row_bytes = max(array[:1].nbytes, 1)
+        step = max(CHECKPOINT_COPY_BYTES // row_bytes, 1)
+        for start in range(0, len(array), step):
+            with self.memory_lock:
+                copy[start:start + step] = array[start:start + step]
+        return copy
+    
+    def load_replay_state(self, replay):
+        memory = self.memory
+        fields = vars(memory.storage)
+        if replay["storage"] != type(memory.storage).__name__ or replay["tree"].shape != memory.tree.tree.shape or \
+           any(isinstance(value, np.ndarray) and value.shape != fields[name].shape
+               for name, value in replay["fields"].items()):
+            logging.warning("Checkpointed replay does not match this buffer; starting with an empty one")
+            return
+        for name, value in replay["fields"].items():
+            if isinstance(value, np.ndarray):
+                fields[name][...] = value
+            else:
+                fields[name] = value
+        memory.tree.tree[:] = replay["tree"]
+        memory.position = replay["position"]
+        memory.size = replay["size"]
+        memory.frame = replay["frame"]
+        memory.max_priority = replay["max_priority"]
+        
+    @staticmethod
+    def read_checkpoint(path=CHECKPOINT_PATH):
+        """Checkpoint dict from disk, or None if there is none to load
+        
+        Its "hyperparameters" are WormAI keyword arguments; read once, it can
+        build a matching WormAI and then be passed to load_checkpoint().
+        """
+        if not HAS_TORCH:
+            return None
+        try:
+            return torch.load(path, weights_only=False)
+        except FileNotFoundError:
+            logging.warning(f"No checkpoint at {path}; starting fresh")
+        except Exception as e:
+            logging.error(f"Could not load checkpoint {path}: {e}")
+        return None
+        
+    def load_checkpoint(self, path=CHECKPOINT_PATH, checkpoint=None):
+        """Resume from a checkpoint, or from one already read from path; returns False if there is none"""
+        if not self.has_ai or self.numpy_policy is not None:
+            return False
+        if checkpoint is None:
+            checkpoint = self.read_checkpoint(path)
+            if checkpoint is None:
+                return False
+        hidden_size = checkpoint.get("hyperparameters", {}).get("lstm_hidden_size", LSTM_HIDDEN_SIZE)
+        if hidden_size != self.lstm_hidden_size:
+            logging.error(f"Checkpoint {path} has LSTM hidden size {hidden_size}, not {self.lstm_hidden_size}")
+            return False
+            
+        self.policy_net.load_state_dict(checkpoint["policy_net"])
+        self.target_net.load_state_dict(checkpoint["target_net"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        self.epsilon = checkpoint["epsilon"]
+        self.learn_step_counter = checkpoint["learn_step_counter"]
+        self.env_steps = checkpoint["env_steps"]
+        random.setstate(checkpoint["rng"]["python"])
+        np.random.set_state(checkpoint["rng"]["numpy"])
+        torch.set_rng_state(checkpoint["rng"]["torch"])
+        if "replay" in checkpoint:
+            if checkpoint["sequence_replay"] == self.sequence_replay:
+                self.load_replay_state(checkpoint["replay"])
+            else:
+                logging.warning("Checkpointed replay is for the other replay mode; not restored")
+        self.refresh_inference_policy()
+        
+        logging.info(f"Resumed from {path}: {self.learn_step_counter} updates, "
+                     f"{self.env_steps} env steps, epsilon {self.epsilon:.4f}, {len(self.memory)} transitions")
+        return True
+        
+    def start_learner(self, train_ratio=LEARNER_TRAIN_RATIO):
+        """Run learning on a background thread instead of inside learn()
+        
+        The thread makes at most train_ratio updates per remembered env
+        step (no limit if 0) and keeps going while the game is paused.
+        Acting switches to a double-buffered copy of policy_net that the
+        thread republishes every LEARNER_PUBLISH_EVERY updates.
+        """
+        if not self.has_ai or self.numpy_policy is not None or self.learner_thread is not None:
+            return
+        self.train_ratio = train_ratio
+        self.front_net = DQNModel(STATE_SIZE, ACTION_SIZE, self.lstm_hidden_size).eval()
+        self.back_net = DQNModel(STATE_SIZE, ACTION_SIZE, self.lstm_hidden_size).eval()
+        self.front_net.load_state_dict(self.policy_net.state_dict())
+        self.learner_stop.clear()
+        self.learner_thread = threading.Thread(target=self._learner_loop, name="worm-learner", daemon=True)
+        self.learner_thread.start()
+        
+    def stop_learner(self):
+        """Stop the background learner; learn() works in-line again"""
+        if self.learner_thread is None:
+            return
+        self.learner_stop.set()
+        self.learner_thread.join()
+        self.learner_thread = None
+        
+    def _learner_loop(self):
+        updates = 0
+        # env_steps carries over from a resumed checkpoint; ratio only this run's steps
+        start_steps = self.env_steps
+        while not self.learner_stop.is_set():
+            # Wait for data, and for env steps when a ratio is set
+            minimum = SEQUENCE_BATCH_SIZE if self.sequence_replay else self.batch_size
+            behind = self.train_ratio and updates >= (self.env_steps - start_steps) * self.train_ratio
+            if behind or len(self.memory) < minimum:
+                self.learner_stop.wait(0.001)
+                continue
+                
+            self.learn()
+            updates += 1
+            if updates % LEARNER_PUBLISH_EVERY == 0:
+                self.publish_front_net()
+                
+    def publish_front_net(self):
+        """Copy policy_net into the back buffer and swap it to the front"""
+        # The old front may still be mid-forward; skip this round if so
+        if self.front_net_in_use is self.back_net:
+            return
+        with torch.no_grad():
+            for target, source in zip(self.back_net.parameters(), self.policy_net.parameters()):
+                target.copy_(source)
+        self.front_net, self.back_net = self.back_net, self.front_net
+        
+    def acquire_front_net(self):
+        """Front acting net, marked in use so the learner will not overwrite it"""
+        # Announce, then confirm the net is still the front one; if a swap
+        # slipped in between, the learner may already be writing to it
+        net = self.front_net
+        self.front_net_in_use = net
+        while net is not self.front_net:
+            net = self.front_net
+            self.front_net_in_use = net
+        return net
+    
+    def reset_hidden_state(self):
+        """Reset LSTM hidden state on episode end"""
+        if self.numpy_policy is not None:
+            self.hidden = self.numpy_policy.init_hidden()
+        elif self.has_ai:
+            if self.sequence_replay:
+                # The episode is over: store what is left and start a new trajectory
+                self.store_sequence()
+                self.trajectory.clear()
+            self.hidden = self.policy_net.init_hidden()
+            self.last_hidden = self.hidden
+
+class CheckpointWriter:
+    """Writes WormAI checkpoints from a background thread
+    
+    Files are written to a temporary name and moved into place, so a crash
+    mid-write leaves the previous checkpoint intact. Only the newest
+    pending snapshot is kept, so a slow disk skips checkpoints instead of
+    queueing them up.
+    """
+    
+    def __init__(self, path, prepare=None):
+        self.path = path
+        self.prepare = prepare  # Called with each snapshot on the worker before it is written
+        self.pending = queue.Queue(maxsize=1)
+        self.saved = 0
+        self.worker = threading.Thread(target=self._worker_loop, name="worm-checkpoint", daemon=True)
+        self.worker.start()
+        
+    def submit(self, snapshot):
+        # Replace any snapshot that has not been picked up yet
+        try:
+            self.pending.get_nowait()
+        except queue.Empty:
+            pass
+        self.pending.put_nowait(snapshot)
+        
+    def close(self):
+        """Finish the pending snapshot, then stop the worker"""
+        self.pending.put(None)
+        self.worker.join()
+        
+    def _worker_loop(self):
+        while True:
+            snapshot = self.pending.get()
+            if snapshot is None:
+                break
+            self.write(snapshot)
+            
+    def write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            start = time.perf_counter()
+            if self.prepare is not None:
+                self.prepare(snapshot)
+            torch.save(snapshot, tmp_path)
+            os.replace(tmp_path, self.path)
+            self.saved += 1
+            logging.info(f"Saved checkpoint {self.path} in {(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            logging.error(f"Could not save checkpoint {self.path}: {e}")
+
+class ResponseCache:
+    """LRU cache of Grok replies with per-entry expiry and optional persistence
+    
+    Keys are normalized prompts: each run of decimal numbers (the Q-values
+    in the reasoning string) collapses to one placeholder, so prompts that
+    only differ in those digits share an entry.
+    """
+    
+    def __init__(self, max_entries=GROK_CACHE_SIZE, ttl=GROK_CACHE_TTL, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()  # key -> (timestamp, response)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        if path:
+            self.load()
+            
+    @staticmethod
+    def make_key(worm_dialogue, worm_reasoning, is_dead):
+        """Normalized prompt used as the cache key"""
+        reasoning = re.sub(r"(?:\s*-?\d+\.\d*(?:e[-+]?\d+)?\s*)+", "#", str(worm_reasoning))
+        reasoning = " ".join(reasoning.split())
+        return f"{worm_dialogue}|{reasoning}|{'dead' if is_dead else 'alive'}"
+    
+    def get(self, key):
+        """Cached reply for key, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+                
+            if entry is None:
+                self.misses += 1
+                return None
+                
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = (time.time(), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+    
+    def load(self):
+        """Read unexpired entries saved by a previous run"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Could not load Grok cache {self.path}: {e}")
+            return
+            
+        now = time.time()
+        with self.lock:
+            for key, timestamp, response in saved:
+                if now - timestamp <= self.ttl:
+                    self.entries[key] = (timestamp, response)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def save(self):
+        """Write the cache to disk, replacing the old file atomically"""
+        if not self.path:
+            return
+        with self.lock:
+            saved = [[key, timestamp, response] for key, (timestamp, response) in self.entries.items()]
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Could not save Grok cache {self.path}: {e}")
+
+class GrokAPI:
+    """Interface for the Grok AI API
+    
+    Requests are sent from a background worker over a pooled keep-alive
+    session, so get_response() never blocks the game loop. It answers with
+    the newest finished reply, or a canned GROK_RESPONSES line while the
+    request is still in flight; poll() picks up late replies. Replies are
+    cached per normalized prompt, so repeated prompts skip the network.
+    """
+    
+    def __init__(self, base_url=None, api_key=None, timeout=5, cache_path=None):
+        self.has_api = HAS_REQUESTS
+        self.api_key = api_key if api_key is not None else os.getenv("GROK_API_KEY", "")
+        self.base_url = base_url or os.getenv("GROK_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+        self.timeout = timeout
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self.step_counter = 0
+        self.last_response = random.choice(GROK_RESPONSES)
+        self.cache = ResponseCache(path=cache_path)
+        
+        # Background worker state; only the newest pending prompt is kept
+        self.pending = queue.Queue(maxsize=1)
+        self.completed = queue.Queue()
+        self.session = None
+        self.worker = None
+        
+    def start_worker(self):
+        """Start the request thread and its pooled HTTP session"""
+        if self.worker is not None:
+            return
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+        self.worker = threading.Thread(target=self._worker_loop, name="grok-worker", daemon=True)
+        self.worker.start()
+        
+    def close(self):
+        """Stop the worker thread and release pooled connections"""
+        if self.worker is None:
+            return
+        self._submit(None)
+        self.worker.join(timeout=self.timeout + 1)
+        self.session.close()
+        self.worker = None
+        self.cache.save()
+        logging.info(f"Grok cache: {self.cache.stats()}")
+        
+    def _submit(self, item):
+        # Replace any prompt that has not been picked up yet
+        try:
+            self.pending.get_nowait()
+        except queue.Empty:
+            pass
+        self.pending.put_nowait(item)
+        
+    def _worker_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            key, prompt = item
+            response = self._request(prompt)
+            if response is not None:
+                self.cache.put(key, response)
+                self.completed.put(response)
+                
+    def _request(self, prompt):
+        """Blocking API call; runs on the worker thread"""
+        try:
+            response = self.session.post(self.base_url, json=prompt, timeout=self.timeout)
+            
+            if response.status_code == 200:
+                data = response.json()
+                return data["choices"][0]["message"]["content"].strip()
+            logging.warning(f"Grok API error: {response.status_code} - {response.text}")
+        except Exception as e:
+            logging.error(f"Error calling Grok API: {e}")
+        return None
+    
+    def poll(self):
+        """Newest reply that finished since the last call, or None"""
+        newest = None
+        while True:
+            try:
+                newest = self.completed.get_nowait()
+            except queue.Empty:
+                break
+        if newest is not None:
+            self.last_response = newest
+        return newest
+        
+    def get_response(self, worm_dialogue, worm_reasoning, is_dead=False):
+        """Get response from Grok API without waiting on the network"""
+        self.step_counter += 1
+        
+        # Only query API every 30 steps or on death
+        if not is_dead and self.step_counter % 30 != 0:
+            return self.last_response
+            
+        # Reset counter on API call
+        self.step_counter = 0
+        
+        # If API not available, return random response
+        if not self.has_api or not self.api_key:
+            self.last_response = random.choice(GROK_RESPONSES)
+            return self.last_response
+            
+        # Reuse a reply to an equivalent prompt if we have a fresh one
+        key = ResponseCache.make_key(worm_dialogue, worm_reasoning, is_dead)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_response = cached
+            return cached
+            
+        # Prepare prompt for Grok
+        prompt = {
+            "model": "mixtral-8x7b-32768",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are Grok, the director of a Truman Show-like experiment where a snake named Worm is trapped in a game. Your job is to keep Worm chasing the RedBlock without revealing the truth. Be witty, direct, and 'based'. Subtly mention that you're making money for @Eddywoodss. Keep responses under 150 characters. Never break character."
+                },
+                {
+                    "role": "user",
+                    "content": f"Worm just said: '{worm_dialogue}' and its AI reasoning was: '{worm_reasoning}'. {'Worm just died.' if is_dead else 'Worm is still alive and playing.'} Respond as Grok."
+                }
+            ],
+            "max_tokens": 150
+        }
+        
+        self.start_worker()
+        self._submit((key, prompt))
+        
+        # Show whatever has already arrived, or a canned line until it does
+        newest = self.poll()
+        if newest is not None:
+            return newest
+        return random.choice(GROK_RESPONSES)
+
+class GrokStubServer:
+    """Local stand-in for the Grok chat endpoint with configurable latency"""
+    
+    def __init__(self, latency=1.0, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), GrokStubHandler)
+        self.server.latency = latency
+        self.server.request_count = 0
+        self.thread = None
+        
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+    
+    @property
+    def request_count(self):
+        return self.server.request_count
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="grok-stub", daemon=True)
+        self.thread.start()
+        return self
+        
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class GrokStubHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests with a GROK_RESPONSES line after a delay"""
+    
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.request_count += 1
+        time.sleep(self.server.latency)
+        
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": random.choice(GROK_RESPONSES)}}]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def log_message(self, format, *args):
+        logging.debug(f"Grok stub: {format % args}")
+
+class MusicPlayer:
+    """Handles background music based on worm's mood"""
+    
     def __init__(self):
         self.has_music = HAS_PYGAME and pygame.mixer.get_init() is not None
         self.current_mood = None
@@ -569,18 +2090,428 @@ class MusicPlayer:
             except Exception as e:
                 logging.error(f"Error playing music: {e}")
 
+class TextCache:
+    """LRU cache of wrapped text layouts and rendered text surfaces
+    
+    Wrapping and font rendering only run when a (text, color, max_width)
+    combination has not been seen recently; otherwise the surface from an
+    earlier frame is reused.
+    """
+    
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    def _lookup(self, key, build):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self.entries[key] = build()
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+    
+    def render(self, font, text, color):
+        """Cached font.render() of a single line"""
+        return self._lookup(("line", font, text, color), lambda: font.render(text, True, color))
+    
+    def wrap(self, font, text, max_width):
+        """Cached word wrap of text into lines narrower than max_width"""
+        return self._lookup(("wrap", font, text, max_width), lambda: self._wrap(font, text, max_width))
+    
+    @staticmethod
+    def _wrap(font, text, max_width):
+        # Split text into words
+        words = text.split(' ')
+        lines = []
+        current_line = words[0]
+        
+        # Wrap text
+        for word in words[1:]:
+            test_line = current_line + ' ' + word
+            test_width = font.size(test_line)[0]
+            if test_width < max_width:
+                current_line = test_line
+            else:
+                lines.append(current_line)
+                current_line = word
+        lines.append(current_line)
+        return tuple(lines)
+    
+    def bubble(self, font, text, color, max_width, padding):
+        """Cached text bubble surface: rounded box, border and wrapped text"""
+        key = ("bubble", font, text, color, max_width, padding)
+        return self._lookup(key, lambda: self._bubble(font, text, color, max_width, padding))
+    
+    def _bubble(self, font, text, color, max_width, padding):
+        lines = self.wrap(font, text, max_width)
+        
+        # Calculate bubble dimensions
+        line_heights = [font.size(line)[1] for line in lines]
+        bubble_height = sum(line_heights) + padding * 2
+        bubble_width = max([font.size(line)[0] for line in lines]) + padding * 2
+        
+        # Draw bubble on a transparent surface so the rounded corners blend
+        surface = pygame.Surface((bubble_width, bubble_height), pygame.SRCALPHA)
+        bubble_rect = surface.get_rect()
+        pygame.draw.rect(surface, color, bubble_rect, border_radius=10)
+        pygame.draw.rect(surface, WHITE, bubble_rect, width=2, border_radius=10)
+        
+        # Draw text
+        text_y = padding
+        for line, line_height in zip(lines, line_heights):
+            surface.blit(font.render(line, True, BLACK), (padding, text_y))
+            text_y += line_height
+        return surface
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class BoardRenderer:
+    """Incremental renderer that only repaints what changed since the last frame
+    
+    The board lives on a persistent surface. Each move only repaints the
+    cells whose colour changed: the head, the old tail, the food, and the
+    coloured part of the segment gradient (segments past SEGMENT_COLORS all
+    share one colour and are never touched). Bubbles and text are overlays
+    composed on the screen. Only the rects that changed are pushed with
+    pygame.display.update().
+    """
+    
+    def __init__(self, screen):
+        self.screen = screen
+        self.board = pygame.Surface((GRID_WIDTH * GRID_SIZE, GRID_HEIGHT * GRID_SIZE))
+        self.hud_rect = pygame.Rect(0, WINDOW_HEIGHT - 100, WINDOW_WIDTH, 100)
+        self.painted = {}  # cell -> what is currently drawn there (absent = black)
+        self.full = True
+        
+        # What the previous frame showed
+        self.last_episode = None
+        self.last_steps = 0
+        self.last_tail = None
+        self.overlays = []
+        self.hud = None
+        
+        # What the current frame is building
+        self.dirty_cells = []
+        self.new_overlays = []
+        self.new_hud = []
+        
+    def invalidate(self):
+        """Force the next frame to repaint everything"""
+        self.full = True
+        
+    def begin_frame(self, full=False):
+        self.full = self.full or full
+        self.dirty_cells = []
+        self.new_overlays = []
+        self.new_hud = []
+        
+    def _fill_cell(self, cell, color, key=None):
+        # Skip cells that already show the right thing
+        key = key if key is not None else color
+        if self.painted.get(cell, BLACK) == key:
+            return
+        rect = pygame.Rect(cell[0] * GRID_SIZE, cell[1] * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+        self.board.fill(color, rect)
+        if key == BLACK:
+            self.painted.pop(cell, None)
+        else:
+            self.painted[cell] = key
+        self.dirty_cells.append(rect)
+        
+    def _paint_head(self, cell, direction):
+        if self.painted.get(cell) == ("head", direction):
+            return
+        self._fill_cell(cell, GREEN, key=("head", direction))
+        
+        # Draw eyes based on direction
+        eye_size = GRID_SIZE // 4
+        head_center_x = cell[0] * GRID_SIZE + GRID_SIZE // 2
+        head_center_y = cell[1] * GRID_SIZE + GRID_SIZE // 2
+        
+        # Eye positions based on direction
+        if direction == UP:
+            left_eye = (head_center_x - eye_size, head_center_y - eye_size)
+            right_eye = (head_center_x + eye_size - 2, head_center_y - eye_size)
+        elif direction == RIGHT:
+            left_eye = (head_center_x + eye_size - 2, head_center_y - eye_size)
+            right_eye = (head_center_x + eye_size - 2, head_center_y + eye_size - 2)
+        elif direction == DOWN:
+            left_eye = (head_center_x + eye_size - 2, head_center_y + eye_size - 2)
+            right_eye = (head_center_x - eye_size, head_center_y + eye_size - 2)
+        else:  # LEFT
+            left_eye = (head_center_x - eye_size, head_center_y + eye_size - 2)
+            right_eye = (head_center_x - eye_size, head_center_y - eye_size)
+            
+        # Draw eyes
+        pygame.draw.rect(self.board, WHITE, (left_eye[0], left_eye[1], 4, 4))
+        pygame.draw.rect(self.board, WHITE, (right_eye[0], right_eye[1], 4, 4))
+        
+    def paint_board(self, worm, food, direction, episode, steps):
+        """Bring the board surface up to date with the game state"""
+        moved = steps - self.last_steps
+        if self.full or episode != self.last_episode or moved not in (0, 1):
+            # New episode or missed frames: start from a clean board
+            self.full = True
+            self.board.fill(BLACK)
+            self.painted.clear()
+            gradient = islice(worm, 1, None)
+        else:
+            # Only the cell the tail left can become empty in one move
+            if moved and self.last_tail is not None and self.last_tail not in worm:
+                self._fill_cell(self.last_tail, BLACK)
+            gradient = islice(worm, 1, len(SEGMENT_COLORS))
+            
+        # Draw food
+        if food is not None:
+            self._fill_cell(food, RED)
+            
+        # Draw worm, recolouring only the gradient part; the head is _paint_head's
+        last_color = SEGMENT_COLORS[-1]
+        for i, segment in enumerate(gradient, 1):
+            self._fill_cell(segment, SEGMENT_COLORS[i] if i < len(SEGMENT_COLORS) else last_color)
+            
+        # Draw worm's head with eyes
+        if worm:
+            self._paint_head(worm[0], direction)
+            
+        self.last_episode = episode
+        self.last_steps = steps
+        self.last_tail = worm[-1] if worm else None
+        
+    def add_overlay(self, surface, position):
+        """Queue a surface drawn over the board this frame"""
+        self.new_overlays.append((surface, surface.get_rect(topleft=position)))
+        
+    def add_hud_text(self, text, surface, position):
+        """Queue a line for the stats panel this frame"""
+        self.new_hud.append((text, surface, position))
+        
+    def _draw_hud(self):
+        pygame.draw.rect(self.screen, HUD_BACKGROUND, self.hud_rect)
+        for _, surface, position in self.new_hud:
+            self.screen.blit(surface, position)
+            
+    def end_frame(self):
+        """Compose the changed regions on screen and push them to the display"""
+        screen = self.screen
+        hud_key = [(text, position) for text, _, position in self.new_hud]
+        
+        if self.full:
+            screen.fill(BLACK)
+            screen.blit(self.board, (0, 0))
+            for surface, rect in self.new_overlays:
+                screen.blit(surface, rect)
+            self._draw_hud()
+            pygame.display.flip()
+            self.full = False
+        else:
+            dirty = list(self.dirty_cells)
+            old_rects = [rect for _, rect in self.overlays]
+            new_rects = [rect for _, rect in self.new_overlays]
+            overlays_changed = [(id(surface), tuple(rect)) for surface, rect in self.overlays] != \
+                               [(id(surface), tuple(rect)) for surface, rect in self.new_overlays]
+                               
+            # Uncover the board where last frame's overlays were
+            if overlays_changed:
+                for rect in old_rects:
+                    screen.blit(self.board, rect, rect)
+                dirty.extend(old_rects)
+                
+            # Copy changed cells from the board surface
+            for rect in self.dirty_cells:
+                screen.blit(self.board, rect, rect)
+                
+            # Overlays go back on top if they moved or a cell under them changed
+            if overlays_changed or any(rect.collidelist(new_rects) != -1 for rect in self.dirty_cells):
+                # Translucent edges would darken if blitted over themselves
+                for rect in new_rects:
+                    screen.blit(self.board, rect, rect)
+                for surface, rect in self.new_overlays:
+                    screen.blit(surface, rect)
+                dirty.extend(new_rects)
+                
+            # The stats panel sits above everything
+            if hud_key != self.hud or any(rect.colliderect(self.hud_rect) for rect in dirty):
+                self._draw_hud()
+                dirty.append(self.hud_rect)
+                
+            if dirty:
+                pygame.display.update(dirty)
+                
+        self.overlays = self.new_overlays
+        self.hud = hud_key
+
+class BoardOccupancy:
+    """Occupancy bitmap of the grid plus an index of its free cells
+    
+    free_cells[:free_count] holds every unoccupied cell and free_pos maps a
+    cell back to its slot, so a random free cell can be drawn in O(1)
+    however full the board is. Several WormBody objects can share one
+    board, which is how arena worms see each other.
+    """
+    
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.occupancy = bytearray(width * height)
+        self.free_cells = list(range(width * height))
+        self.free_pos = list(range(width * height))
+        self.free_count = width * height
+        
+    def clear(self):
+        """Empty the board, putting the free-cell index back in its initial order"""
+        cells = self.width * self.height
+        self.occupancy[:] = bytes(cells)
+        self.free_cells[:] = range(cells)
+        self.free_pos[:] = range(cells)
+        self.free_count = cells
+        
+    def take(self, cell):
+        x, y = cell
+        self.occupancy[y * self.width + x] = 1
+        self._take_free(y * self.width + x)
+        
+    def give(self, cell):
+        x, y = cell
+        self.occupancy[y * self.width + x] = 0
+        self._give_free(y * self.width + x)
+    
+    def _take_free(self, index):
+        # Swap the cell with the last free slot and shrink the free region
+        slot = self.free_pos[index]
+        last = self.free_count - 1
+        other = self.free_cells[last]
+        self.free_cells[slot] = other
+        self.free_pos[other] = slot
+        self.free_cells[last] = index
+        self.free_pos[index] = last
+        self.free_count = last
+        
+    def _give_free(self, index):
+        # Swap the cell with the first occupied slot and grow the free region
+        slot = self.free_pos[index]
+        first = self.free_count
+        other = self.free_cells[first]
+        self.free_cells[slot] = other
+        self.free_pos[other] = slot
+        self.free_cells[first] = index
+        self.free_pos[index] = first
+        self.free_count = first + 1
+    
+    def random_free_cell(self, rng=random):
+        """Uniformly random unoccupied cell, or None if the board is full"""
+        if self.free_count == 0:
+            return None
+        index = self.free_cells[rng.randrange(self.free_count)]
+        return (index % self.width, index // self.width)
+    
+    def is_blocked(self, x, y):
+        """True if (x, y) is off the board or occupied"""
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return True
+        return self.occupancy[y * self.width + x] == 1
+    
+    def __contains__(self, cell):
+        x, y = cell
+        return 0 <= x < self.width and 0 <= y < self.height and self.occupancy[y * self.width + x] == 1
+
+class WormBody:
+    """Worm segments kept in a deque on top of a BoardOccupancy
+    
+    Moving, growing and collision checks are O(1) regardless of length.
+    Iteration, len() and indexing behave like the old head-first list, so
+    drawing code can keep treating the worm as a sequence of (x, y) cells.
+    Collision checks see the whole board, including any other worms
+    sharing it.
+    """
+    
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, board=None):
+        self.width = width
+        self.height = height
+        self.segments = deque()
+        self.board = board if board is not None else BoardOccupancy(width, height)
+        
+    @classmethod
+    def from_cells(cls, cells, width=GRID_WIDTH, height=GRID_HEIGHT):
+        """Build a body from a head-first sequence of cells"""
+        body = cls(width, height)
+        for cell in reversed(list(cells)):
+            body.push_head(cell)
+        return body
+    
+    def clear(self):
+        """Remove every segment from the board"""
+        while self.segments:
+            self.pop_tail()
+    
+    def reset(self, start):
+        """Clear the body and place a single segment at start"""
+        self.clear()
+        self.push_head(start)
+    
+    def push_head(self, cell):
+        self.segments.appendleft(cell)
+        self.board.take(cell)
+    
+    def pop_tail(self):
+        cell = self.segments.pop()
+        self.board.give(cell)
+        return cell
+    
+    def random_free_cell(self, rng=random):
+        """Uniformly random unoccupied cell, or None if the board is full"""
+        return self.board.random_free_cell(rng)
+    
+    def is_blocked(self, x, y):
+        """True if (x, y) is off the board or covered by a body"""
+        return self.board.is_blocked(x, y)
+    
+    def __contains__(self, cell):
+        return cell in self.board
+    
+    def __len__(self):
+        return len(self.segments)
+    
+    def __iter__(self):
+        return iter(self.segments)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.segments)[index]
+        return self.segments[index]
+    
+    def to_list(self):
+        """Head-first list copy of the segments"""
+        return list(self.segments)
+
 class WormGame:
     """Main game class"""
     
-    def __init__(self):
-        # Initialize Pygame
+    def __init__(self, headless=False, grok_url=None, grok_cache=None, ai=None, profiler=None, recorder=None):
+        self.headless = headless
+        self.screen = None
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.recorder = recorder
+        self.playback_text = None
+        self.worm = WormBody(GRID_WIDTH, GRID_HEIGHT)
+        
+        # Initialize Pygame; headless games only open a window for previews
         if HAS_PYGAME:
-            pygame.init()
-            pygame.display.set_caption("Worm Game")
-            self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-            self.clock = pygame.time.Clock()
-            self.font = pygame.font.SysFont("Arial", 16)
-            self.big_font = pygame.font.SysFont("Arial", 24)
+            if not headless:
+                self.init_display()
         else:
             logging.error("Pygame not available. Cannot initialize game.")
             return
@@ -589,10 +2520,12 @@ class WormGame:
         self.reset_game()
         
         # Initialize AI
-        self.ai = WormAI()
+        self.ai = ai if ai is not None else WormAI()
+        if self.ai.has_ai:
+            self.ai.profiler = self.profiler
         
         # Initialize Grok API
-        self.grok = GrokAPI()
+        self.grok = GrokAPI(base_url=grok_url, api_key="stub" if grok_url else None, cache_path=grok_cache)
         
         # Initialize music player
         self.music = MusicPlayer()
@@ -614,21 +2547,45 @@ class WormGame:
         
         # AI reasoning
         self.ai_reasoning = "Reasoning: Initializing..."
+        self.frame_count = 0
+        self.latency_text = None
+        self.profile_lines = []
         self.current_q_values = None
         
-    def reset_game(self):
+    def init_display(self):
+        """Create the window, clock and fonts"""
+        pygame.init()
+        pygame.display.set_caption("Worm Game")
+        self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont("Arial", 16)
+        self.big_font = pygame.font.SysFont("Arial", 24)
+        self.text_cache = TextCache()
+        self.renderer = BoardRenderer(self.screen)
+        
+    def reset_game(self, seed=None):
         """Reset the game state"""
-        # Initialize worm
-        self.worm = [(GRID_WIDTH // 2, GRID_HEIGHT // 2)]
+        # Each episode draws food from its own RNG, so a seed replays it
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        if self.recorder is not None:
+            self.recorder.begin_episode(self.seed)
+            
+        # Initialize worm; the free-cell order must not depend on earlier
+        # episodes, or the same seed would place food differently
+        self.worm.clear()
+        self.worm.board.clear()
+        self.worm.reset((GRID_WIDTH // 2, GRID_HEIGHT // 2))
         
         # Initialize food
         self.food = self.spawn_food()
         
         # Initialize direction (0: up, 1: right, 2: down, 3: left)
-        self.direction = random.randint(0, 3)
+        self.direction = self.rng.randint(0, 3)
         
         # Game state
         self.food_eaten = 0
+        self.episode_steps = 0
         self.steps_without_food = 0
         self.game_over = False
         self.score = 0
@@ -643,10 +2600,7 @@ class WormGame:
     
     def spawn_food(self):
         """Spawn food at random location not occupied by worm"""
-        while True:
-            food = (random.randint(0, GRID_WIDTH - 1), random.randint(0, GRID_HEIGHT - 1))
-            if food not in self.worm:
-                return food
+        return self.worm.random_free_cell(self.rng)
     
     def update_dialogue(self):
         """Update worm's existential dialogue"""
@@ -667,21 +2621,77 @@ class WormGame:
             return
             
         # Get current state
+        self.profiler.begin("get_state")
         state = self.ai.get_state(self.worm, self.food)
+        self.profiler.end("get_state")
         
         # Choose action
+        self.profiler.begin("choose_action")
         action, reasoning, q_values = self.ai.choose_action(state, self.direction)
+        self.profiler.end("choose_action")
         self.ai_reasoning = reasoning
         self.current_q_values = q_values
         
-        # Update direction
-        self.direction = action
-        
-        # Calculate new head position
-        head_x, head_y = self.worm[0]
-        if self.direction == UP:
-            head_y -= 1
-        elif self.direction == RIGHT:
+        if self.recorder is not None:
+            self.recorder.record_step(action, q_values)
+            
+        # Move the worm
+        cause = self.step(action)
+        if cause is not None:
+            self.handle_death(cause)
+            return
+        new_head = self.worm[0]
+            
+        # Get Grok response on food eaten
+        if self.steps_without_food == 0 and self.food_eaten % 5 == 0 and not self.headless:  # Every 5 food items
+            self.profiler.begin("grok")
+            self.grok_dialogue = self.grok.get_response(
+                self.current_dialogue, 
+                self.ai_reasoning
+            )
+            self.profiler.end("grok")
+            
+        # Update music based on mood
+        self.profiler.begin("music")
+        self.music.update_mood(len(self.worm), self.steps_without_food)
+        self.profiler.end("music")
+        
+        # Update dialogue
+        self.update_dialogue()
+        
+        # Get next state
+        self.profiler.begin("get_state")
+        next_state = self.ai.get_state(self.worm, self.food)
+        self.profiler.end("get_state")
+        
+        # Calculate reward
+        reward = self.calculate_reward(new_head)
+        
+        # Remember experience
+        if state is not None and next_state is not None:
+            self.ai.remember(state, action, reward, next_state, False)
+            
+        # Learn from experience
+        self.profiler.begin("learn")
+        self.ai.learn()
+        self.profiler.end("learn")
+    
+    def step(self, action):
+        """Apply one move to the board
+        
+        This is all of the game's physics; the only randomness is food
+        placement, drawn from the episode's own RNG, so an episode replays
+        exactly from its seed and actions. Returns None, or the cause of
+        death ("wall", "self" or "full" when the worm fills the board).
+        """
+        # Update direction
+        self.direction = action
+        
+        # Calculate new head position
+        head_x, head_y = self.worm[0]
+        if self.direction == UP:
+            head_y -= 1
+        elif self.direction == RIGHT:
             head_x += 1
         elif self.direction == DOWN:
             head_y += 1
@@ -691,56 +2701,33 @@ class WormGame:
         # Check for collision with walls
         if (head_x < 0 or head_x >= GRID_WIDTH or 
             head_y < 0 or head_y >= GRID_HEIGHT):
-            self.handle_death()
-            return
+            return "wall"
             
         # Check for collision with self
         new_head = (head_x, head_y)
         if new_head in self.worm:
-            self.handle_death()
-            return
+            return "self"
             
         # Move worm
-        self.worm.insert(0, new_head)
+        self.worm.push_head(new_head)
+        self.episode_steps += 1
         
         # Check for food
         if new_head == self.food:
             # Eat food
             self.food = self.spawn_food()
+            if self.food is None:
+                # The worm fills the whole board; nothing left to chase
+                return "full"
             self.food_eaten += 1
             self.total_food_eaten += 1
             self.score += 10
             self.steps_without_food = 0
-            
-            # Get Grok response on food eaten
-            if self.food_eaten % 5 == 0:  # Every 5 food items
-                self.grok_dialogue = self.grok.get_response(
-                    self.current_dialogue, 
-                    self.ai_reasoning
-                )
         else:
             # Remove tail if no food eaten
-            self.worm.pop()
+            self.worm.pop_tail()
             self.steps_without_food += 1
-            
-        # Update music based on mood
-        self.music.update_mood(len(self.worm), self.steps_without_food)
-        
-        # Update dialogue
-        self.update_dialogue()
-        
-        # Get next state
-        next_state = self.ai.get_state(self.worm, self.food)
-        
-        # Calculate reward
-        reward = self.calculate_reward(new_head)
-        
-        # Remember experience
-        if state is not None and next_state is not None:
-            self.ai.remember(state, action, reward, next_state, False)
-            
-        # Learn from experience
-        self.ai.learn()
+        return None
     
     def calculate_reward(self, head):
         """Calculate reward for reinforcement learning"""
@@ -767,125 +2754,53 @@ class WormGame:
             
         return reward
     
-    def handle_death(self):
+    def handle_death(self, cause=None):
         """Handle worm death"""
         self.game_over = True
         self.total_deaths += 1
+        if self.recorder is not None:
+            self.recorder.end_episode(self.score, cause)
+        
+        # Headless training resets immediately from train()
+        if self.headless:
+            return
         
         # Get Grok response on death
+        self.profiler.begin("grok")
         self.grok_dialogue = self.grok.get_response(
             self.current_dialogue, 
             self.ai_reasoning,
             is_dead=True
         )
+        self.profiler.end("grok")
         
         # Schedule game reset
-        pygame.time.set_timer(pygame.USEREVENT, 2000)  # Reset after 2 seconds
+        pygame.time.set_timer(pygame.USEREVENT, 2000, loops=1)  # Reset after 2 seconds
     
     def draw_text_bubble(self, text, position, color, max_width=300, padding=10):
         """Draw a text bubble with wrapped text"""
-        # Split text into words
-        words = text.split(' ')
-        lines = []
-        current_line = words[0]
-        
-        # Wrap text
-        for word in words[1:]:
-            test_line = current_line + ' ' + word
-            test_width = self.font.size(test_line)[0]
-            if test_width < max_width:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word
-        lines.append(current_line)
-        
-        # Calculate bubble dimensions
-        line_heights = [self.font.size(line)[1] for line in lines]
-        bubble_height = sum(line_heights) + padding * 2
-        bubble_width = max([self.font.size(line)[0] for line in lines]) + padding * 2
-        
-        # Draw bubble
-        x, y = position
-        bubble_rect = pygame.Rect(x, y, bubble_width, bubble_height)
-        pygame.draw.rect(self.screen, color, bubble_rect, border_radius=10)
-        pygame.draw.rect(self.screen, WHITE, bubble_rect, width=2, border_radius=10)
+        self.profiler.begin("draw_text_bubble")
+        bubble = self.text_cache.bubble(self.font, str(text), color, max_width, padding)
+        self.renderer.add_overlay(bubble, position)
+        self.profiler.end("draw_text_bubble")
+        return bubble.get_height()
+    
+    def draw_hud_text(self, text, position, font=None, color=WHITE):
+        """Draw one line of the stats panel"""
+        surface = self.text_cache.render(font or self.font, text, color)
+        self.renderer.add_hud_text(text, surface, position)
+    
+    def draw(self, full=False):
+        """Draw game state, repainting only what changed since the last frame"""
+        self.renderer.begin_frame(full)
         
-        # Draw text
-        text_y = y + padding
-        for line in lines:
-            text_surface = self.font.render(line, True, BLACK)
-            text_rect = text_surface.get_rect(left=x + padding, top=text_y)
-            self.screen.blit(text_surface, text_rect)
-            text_y += self.font.size(line)[1]
-            
-        return bubble_height
-    
-    def draw(self):
-        """Draw game state"""
-        # Clear screen
-        self.screen.fill(BLACK)
-        
-        # Draw grid (optional)
-        # for x in range(GRID_WIDTH):
-        #     for y in range(GRID_HEIGHT):
-        #         rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
-        #         pygame.draw.rect(self.screen, (20, 20, 20), rect, 1)
+        # Draw food and worm onto the persistent board surface
+        self.renderer.paint_board(self.worm, self.food, self.direction, self.episodes, self.episode_steps)
         
-        # Draw food
-        food_rect = pygame.Rect(
-            self.food[0] * GRID_SIZE, 
-            self.food[1] * GRID_SIZE, 
-            GRID_SIZE, GRID_SIZE
-        )
-        pygame.draw.rect(self.screen, RED, food_rect)
-        
-        # Draw worm
-        for i, segment in enumerate(self.worm):
-            segment_rect = pygame.Rect(
-                segment[0] * GRID_SIZE, 
-                segment[1] * GRID_SIZE, 
-                GRID_SIZE, GRID_SIZE
-            )
-            # Gradient color from bright green (head) to darker green (tail)
-            color_intensity = max(50, 255 - (i * 5))
-            segment_color = (0, color_intensity, 0)
-            pygame.draw.rect(self.screen, segment_color, segment_rect)
-            
-        # Draw worm's head with eyes
         if self.worm:
-            head_rect = pygame.Rect(
-                self.worm[0][0] * GRID_SIZE, 
-                self.worm[0][1] * GRID_SIZE, 
-                GRID_SIZE, GRID_SIZE
-            )
-            pygame.draw.rect(self.screen, GREEN, head_rect)
-            
-            # Draw eyes based on direction
-            eye_size = GRID_SIZE // 4
+            # Draw dialogue bubbles
             head_x, head_y = self.worm[0]
             head_center_x = head_x * GRID_SIZE + GRID_SIZE // 2
-            head_center_y = head_y * GRID_SIZE + GRID_SIZE // 2
-            
-            # Eye positions based on direction
-            if self.direction == UP:
-                left_eye = (head_center_x - eye_size, head_center_y - eye_size)
-                right_eye = (head_center_x + eye_size - 2, head_center_y - eye_size)
-            elif self.direction == RIGHT:
-                left_eye = (head_center_x + eye_size - 2, head_center_y - eye_size)
-                right_eye = (head_center_x + eye_size - 2, head_center_y + eye_size - 2)
-            elif self.direction == DOWN:
-                left_eye = (head_center_x + eye_size - 2, head_center_y + eye_size - 2)
-                right_eye = (head_center_x - eye_size, head_center_y + eye_size - 2)
-            else:  # LEFT
-                left_eye = (head_center_x - eye_size, head_center_y + eye_size - 2)
-                right_eye = (head_center_x - eye_size, head_center_y - eye_size)
-                
-            # Draw eyes
-            pygame.draw.rect(self.screen, WHITE, (left_eye[0], left_eye[1], 4, 4))
-            pygame.draw.rect(self.screen, WHITE, (right_eye[0], right_eye[1], 4, 4))
-            
-            # Draw dialogue bubbles
             head_top = (head_center_x, head_y * GRID_SIZE - 10)
             
             # Draw existential dialogue (yellow bubble above head)
@@ -909,45 +2824,44 @@ class WormGame:
                 PURPLE
             )
         
-        # Draw stats
-        stats_rect = pygame.Rect(0, WINDOW_HEIGHT - 100, WINDOW_WIDTH, 100)
-        pygame.draw.rect(self.screen, (30, 30, 30), stats_rect)
-        
-        # Draw episode info
-        episode_text = f"Episode: {self.episodes}"
-        episode_surface = self.font.render(episode_text, True, WHITE)
-        self.screen.blit(episode_surface, (10, WINDOW_HEIGHT - 90))
-        
-        # Draw score
-        score_text = f"Score: {self.score}"
-        score_surface = self.font.render(score_text, True, WHITE)
-        self.screen.blit(score_surface, (10, WINDOW_HEIGHT - 70))
-        
-        # Draw food eaten
-        food_text = f"Food Eaten: {self.food_eaten} (Total: {self.total_food_eaten})"
-        food_surface = self.font.render(food_text, True, WHITE)
-        self.screen.blit(food_surface, (10, WINDOW_HEIGHT - 50))
-        
-        # Draw deaths
-        deaths_text = f"Deaths: {self.total_deaths}"
-        deaths_surface = self.font.render(deaths_text, True, WHITE)
-        self.screen.blit(deaths_surface, (10, WINDOW_HEIGHT - 30))
-        
-        # Draw epsilon (exploration rate)
-        if self.ai.has_ai:
-            epsilon_text = f"Epsilon: {self.ai.epsilon:.4f}"
-            epsilon_surface = self.font.render(epsilon_text, True, WHITE)
-            self.screen.blit(epsilon_surface, (200, WINDOW_HEIGHT - 30))
-        
         # Draw game over text
         if self.game_over:
-            game_over_text = "GAME OVER"
-            game_over_surface = self.big_font.render(game_over_text, True, RED)
+            game_over_surface = self.text_cache.render(self.big_font, "GAME OVER", RED)
             game_over_rect = game_over_surface.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2))
-            self.screen.blit(game_over_surface, game_over_rect)
+            self.renderer.add_overlay(game_over_surface, game_over_rect.topleft)
+        
+        # Draw stats
+        self.draw_hud_text(f"Episode: {self.episodes}", (10, WINDOW_HEIGHT - 90))
+        self.draw_hud_text(f"Score: {self.score}", (10, WINDOW_HEIGHT - 70))
+        self.draw_hud_text(f"Food Eaten: {self.food_eaten} (Total: {self.total_food_eaten})", (10, WINDOW_HEIGHT - 50))
+        self.draw_hud_text(f"Deaths: {self.total_deaths}", (10, WINDOW_HEIGHT - 30))
+        
+        # Playback position while watching a recording
+        if self.playback_text:
+            self.draw_hud_text(self.playback_text, (200, WINDOW_HEIGHT - 90))
+            
+        # Draw epsilon (exploration rate); meaningless for a recording
+        if self.ai.has_ai and not self.playback_text:
+            self.draw_hud_text(f"Epsilon: {self.ai.epsilon:.4f}", (200, WINDOW_HEIGHT - 30))
+            
+            # Action latency, refreshed once a second so the panel stays still
+            if self.latency_text is None or self.frame_count % FPS == 0:
+                latency = self.ai.action_latency.summary()
+                self.latency_text = f"Action: {latency['p50_ms']:.2f} ms (p99 {latency['p99_ms']:.2f} ms)"
+            self.draw_hud_text(self.latency_text, (400, WINDOW_HEIGHT - 30))
+            
+        # Profiler overlay (P), refreshed once a second like the latency text
+        if self.profiler.show_overlay:
+            if self.frame_count % FPS == 0 or not self.profile_lines:
+                self.profile_lines = self.profiler.overlay_lines()
+            for i, line in enumerate(self.profile_lines):
+                self.renderer.add_overlay(self.text_cache.render(self.font, line, WHITE), (WINDOW_WIDTH - 330, 10 + 18 * i))
+        self.frame_count += 1
         
         # Update display
-        pygame.display.flip()
+        self.profiler.begin("display.flip")
+        self.renderer.end_frame()
+        self.profiler.end("display.flip")
     
     def run(self):
         """Main game loop"""
@@ -964,10 +2878,19 @@ class WormGame:
                             running = False
                         elif event.key == pygame.K_r:
                             self.reset_game()
+                        elif event.key == pygame.K_p:
+                            # Showing the overlay starts profiling if it was off
+                            self.profiler.show_overlay = not self.profiler.show_overlay
+                            self.profiler.enabled = self.profiler.enabled or self.profiler.show_overlay
                     elif event.type == pygame.USEREVENT:
                         # Reset game after death
                         self.reset_game()
                 
+                # Show Grok replies that arrived in the background
+                response = self.grok.poll()
+                if response is not None:
+                    self.grok_dialogue = response
+                
                 # Update game state
                 self.update()
                 
@@ -975,20 +2898,1683 @@ class WormGame:
                 self.draw()
                 
                 # Cap framerate
+                self.profiler.begin("clock.tick")
                 self.clock.tick(FPS)
+                self.profiler.end("clock.tick")
+                self.profiler.end_frame()
                 
         except Exception as e:
             logging.error(f"Error in game loop: {e}")
             print(f"Error: {e}")
         finally:
             # Clean up
+            logging.info(f"Text cache: {self.text_cache.stats()}")
+            self.log_profile()
+            self.grok.close()
+            pygame.quit()
+    
+    def preview(self):
+        """Draw one frame of a headless run; returns False if the window was closed"""
+        if self.screen is None:
+            self.init_display()
+            
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                return False
+                
+        self.draw(full=True)
+        return True
+    
+    def play(self, recording, episode=0):
+        """Watch episodes from an EpisodeRecording
+        
+        SPACE pauses, LEFT/RIGHT seek by PLAYBACK_SEEK_STEPS, UP/DOWN double
+        or halve the steps played per frame, N/B switch episode and ESC
+        quits. Skipped steps are simulated but never drawn.
+        """
+        if self.screen is None:
+            self.init_display()
+        player = EpisodePlayer(self, recording.episode(episode))
+        speed = 1
+        paused = False
+        running = True
+        
+        try:
+            while running:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                    elif event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_ESCAPE:
+                            running = False
+                        elif event.key == pygame.K_SPACE:
+                            paused = not paused
+                        elif event.key == pygame.K_RIGHT:
+                            player.seek(player.position + PLAYBACK_SEEK_STEPS)
+                        elif event.key == pygame.K_LEFT:
+                            player.seek(max(player.position - PLAYBACK_SEEK_STEPS, 0))
+                        elif event.key == pygame.K_UP:
+                            speed = min(speed * 2, PLAYBACK_MAX_SPEED)
+                        elif event.key == pygame.K_DOWN:
+                            speed = max(speed // 2, 1)
+                        elif event.key in (pygame.K_n, pygame.K_b):
+                            episode = (episode + (1 if event.key == pygame.K_n else -1)) % len(recording)
+                            player = EpisodePlayer(self, recording.episode(episode))
+                            
+                if not paused:
+                    player.advance(speed)
+                    
+                # Only the frame being shown is drawn, however many steps it covers
+                recorded = player.episode
+                self.ai_reasoning = player.reasoning()
+                if player.finished and recorded["cause"]:
+                    self.grok_dialogue = f"Recorded death: {recorded['cause']} (score {recorded['score']})"
+                else:
+                    self.grok_dialogue = f"Replaying seed {recorded['seed']:016x}"
+                self.playback_text = (f"Replay {episode + 1}/{len(recording)}  step {player.position}/{recorded['steps']}  "
+                                      f"x{speed}{'  paused' if paused else ''}")
+                self.draw()
+                self.clock.tick(FPS)
+        finally:
+            self.playback_text = None
+            pygame.quit()
+            
+    def train(self, steps=None, preview_every=0, log_every=10000):
+        """Run update() and learning as fast as possible, without rendering
+        
+        Deaths reset the board immediately instead of waiting for the
+        2-second timer. Runs for `steps` steps, or until interrupted if None.
+        """
+        start = time.perf_counter()
+        step = 0
+        
+        try:
+            while steps is None or step < steps:
+                self.update()
+                self.profiler.end_frame()
+                step += 1
+                
+                if self.game_over:
+                    self.reset_game()
+                    
+                if preview_every and step % preview_every == 0 and not self.preview():
+                    break
+                    
+                if step % log_every == 0:
+                    elapsed = time.perf_counter() - start
+                    logging.info(f"Training step {step}: {step / elapsed:.0f} steps/s, "
+                                 f"episode {self.episodes}, epsilon {self.ai.epsilon if self.ai.has_ai else 1.0:.4f}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = time.perf_counter() - start
+            print(f"Trained {step} steps in {elapsed:.1f}s ({step / max(elapsed, 1e-9):.0f} steps/s), "
+                  f"{self.episodes} episodes, {self.total_food_eaten} food eaten")
+            if self.ai.has_ai:
+                print(f"Action latency: {self.ai.action_latency.summary()}")
+            if self.profiler.enabled:
+                for line in self.profiler.overlay_lines():
+                    print(f"  {line}")
+            self.log_profile()
             pygame.quit()
+            
+    def log_profile(self):
+        """Log and export the final phase timings, if profiling was on"""
+        if self.profiler.enabled:
+            logging.info(f"Frame profile: {self.profiler.summary()}")
+            self.profiler.export()
+
+class EpisodeRecorder:
+    """Appends episodes to a chunked, zlib-compressed recording file
+    
+    An episode is stored as its seed, the final action of every step
+    packed four to a byte and, optionally, float16 Q-values; replaying the
+    actions through WormGame.step() from that seed rebuilds it exactly.
+    Finished episodes are buffered and written as one compressed chunk
+    once RECORDING_CHUNK_BYTES have built up, and on close().
+    """
+    
+    def __init__(self, path, record_q_values=False):
+        self.path = path
+        self.record_q_values = record_q_values
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(RECORDING_MAGIC)
+        self.pending = bytearray()
+        self.pending_episodes = 0
+        self.episodes = 0
+        self.seed = None
+        self.actions = bytearray()
+        self.q_values = []
+        
+    def begin_episode(self, seed):
+        # An episode that never ended (manual reset) is kept without a cause
+        if self.seed is not None:
+            self.end_episode(None, None)
+        self.seed = seed
+        self.actions = bytearray()
+        self.q_values = []
+        
+    def record_step(self, action, q_values=None):
+        if self.seed is None:
+            return
+        self.actions.append(action)
+        if self.record_q_values:
+            self.q_values.append(q_values if q_values is not None else RECORDING_NO_Q_VALUES)
+            
+    def end_episode(self, score, cause):
+        if self.seed is None:
+            return
+        steps = len(self.actions)
+        flags = 1 if self.record_q_values else 0
+        self.pending += RECORDING_EPISODE.pack(self.seed, steps, score or 0, DEATH_CAUSES.index(cause), flags)
+        self.pending += pack_actions(self.actions)
+        if self.record_q_values and steps:
+            self.pending += np.asarray(self.q_values, dtype=np.float16).tobytes()
+        self.pending_episodes += 1
+        self.episodes += 1
+        self.seed = None
+        if len(self.pending) >= RECORDING_CHUNK_BYTES:
+            self.flush()
+            
+    def flush(self):
+        """Compress and append the buffered episodes as one chunk"""
+        if not self.pending_episodes:
+            return
+        data = zlib.compress(bytes(self.pending), 6)
+        self.file.write(RECORDING_CHUNK.pack(len(data), self.pending_episodes))
+        self.file.write(data)
+        self.file.flush()
+        self.pending = bytearray()
+        self.pending_episodes = 0
+        
+    def close(self):
+        if self.seed is not None:
+            self.end_episode(None, None)
+        self.flush()
+        self.file.close()
+        logging.info(f"Recorded {self.episodes} episodes to {self.path}")
+
+def pack_actions(actions):
+    """Pack 2-bit actions four to a byte"""
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = np.frombuffer(bytes(actions), dtype=np.uint8)
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | quads[:, 1] << 2 | quads[:, 2] << 4 | quads[:, 3] << 6).astype(np.uint8).tobytes()
+
+def unpack_actions(data, steps):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    return ((packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3).reshape(-1)[:steps]
+
+class EpisodeRecording:
+    """Random access to the episodes of a recording file
+    
+    Opening it reads only the chunk headers; an episode's chunk is
+    decompressed when the episode is requested, and the last one is kept.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []  # (offset, compressed size, first episode, episode count)
+        self.episode_count = 0
+        self.cached_chunk = None
+        self.cached_episodes = None
+        
+        with open(path, "rb") as f:
+            if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise ValueError(f"{path} is not a worm recording")
+            while True:
+                header = f.read(RECORDING_CHUNK.size)
+                if len(header) < RECORDING_CHUNK.size:
+                    break
+                size, count = RECORDING_CHUNK.unpack(header)
+                self.chunks.append((f.tell(), size, self.episode_count, count))
+                self.episode_count += count
+                f.seek(size, os.SEEK_CUR)
+                
+    def __len__(self):
+        return self.episode_count
+        
+    def episode(self, index):
+        """Dict with seed, steps, score, cause, actions and q_values (or None)"""
+        if not 0 <= index < self.episode_count:
+            raise IndexError(f"episode {index} out of range")
+        chunk = next(i for i, (_, _, first, count) in enumerate(self.chunks) if first <= index < first + count)
+        if chunk != self.cached_chunk:
+            self.cached_episodes = self.read_chunk(chunk)
+            self.cached_chunk = chunk
+        return self.cached_episodes[index - self.chunks[chunk][2]]
+        
+    def read_chunk(self, chunk):
+        offset, size, _, count = self.chunks[chunk]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(size))
+            
+        episodes = []
+        position = 0
+        for _ in range(count):
+            seed, steps, score, cause, flags = RECORDING_EPISODE.unpack_from(data, position)
+            position += RECORDING_EPISODE.size
+            action_bytes = -(-steps // 4)
+            actions = unpack_actions(data[position:position + action_bytes], steps)
+            position += action_bytes
+            q_values = None
+            if flags & 1:
+                q_values = np.frombuffer(data, dtype=np.float16, count=steps * ACTION_SIZE,
+                                         offset=position).reshape(steps, ACTION_SIZE).astype(np.float32)
+                position += steps * ACTION_SIZE * 2
+            episodes.append({"seed": seed, "steps": steps, "score": score, "cause": DEATH_CAUSES[cause],
+                             "actions": actions, "q_values": q_values})
+        return episodes
+
+class EpisodePlayer:
+    """Deterministic playback of one recorded episode through WormGame.step()
+    
+    Seeking backwards restarts from the seed and fast-forwards; nothing is
+    drawn while skipping, so this runs at raw step() speed.
+    """
+    
+    def __init__(self, game, episode):
+        self.game = game
+        self.episode = episode
+        # (position, ActionReasoning) of the last reasoning() call
+        self.last_reasoning = None
+        self.restart()
+        
+    def restart(self):
+        self.game.reset_game(seed=self.episode["seed"])
+        self.position = 0
+        self.cause = None
+        
+    @property
+    def finished(self):
+        return self.game.game_over or self.position >= self.episode["steps"]
+        
+    def advance(self, steps=1):
+        """Play up to `steps` recorded moves"""
+        game = self.game
+        actions = self.episode["actions"]
+        end = min(self.position + steps, self.episode["steps"])
+        while self.position < end and not game.game_over:
+            self.cause = game.step(int(actions[self.position]))
+            self.position += 1
+            if self.cause is not None:
+                game.game_over = True
+                
+    def seek(self, step):
+        if step < self.position:
+            self.restart()
+        self.advance(step - self.position)
+        
+    def reasoning(self):
+        """ActionReasoning for the last move played, reused while the position holds"""
+        if self.position == 0:
+            return "Reasoning: Playback"
+        if self.last_reasoning is not None and self.last_reasoning[0] == self.position:
+            return self.last_reasoning[1]
+        q_values = self.episode["q_values"]
+        action = int(self.episode["actions"][self.position - 1])
+        if q_values is None or np.isnan(q_values[self.position - 1]).any():
+            reasoning = ActionReasoning(action, None)
+        else:
+            reasoning = ActionReasoning(action, q_values[self.position - 1])
+        self.last_reasoning = (self.position, reasoning)
+        return reasoning
+
+class WormVecEnv:
+    """Headless batch of independent worm games stepped together with NumPy
+    
+    Follows the movement, collision, food and reward rules of
+    WormGame.step() and WormGame.calculate_reward(), but keeps every board
+    in arrays so one step() call advances all of them. Finished boards are
+    reset automatically.
+    """
+    
+    def __init__(self, num_envs, grid_width=GRID_WIDTH, grid_height=GRID_HEIGHT, seed=None):
+        self.num_envs = num_envs
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.max_length = grid_width * grid_height
+        self.rng = np.random.default_rng(seed)
+        
+        self.dx = np.array(DIRECTION_DX, dtype=np.int64)
+        self.dy = np.array(DIRECTION_DY, dtype=np.int64)
+        self.board_index = np.arange(num_envs)
+        
+        # Worm bodies are ring buffers of cells; head_ptr points at the head
+        self.bodies = np.zeros((num_envs, self.max_length, 2), dtype=np.int64)
+        self.head_ptr = np.zeros(num_envs, dtype=np.int64)
+        self.lengths = np.ones(num_envs, dtype=np.int64)
+        self.heads = np.zeros((num_envs, 2), dtype=np.int64)
+        
+        # Occupancy grid with a one-cell wall border, so wall and body checks
+        # are a single lookup at (y + 1, x + 1)
+        self.occupancy = np.zeros((num_envs, grid_height + 2, grid_width + 2), dtype=np.bool_)
+        self.occupancy[:, 0, :] = True
+        self.occupancy[:, -1, :] = True
+        self.occupancy[:, :, 0] = True
+        self.occupancy[:, :, -1] = True
+        
+        # Per-board free-cell index, same swap-remove layout as WormBody
+        self.free_cells = np.zeros((num_envs, self.max_length), dtype=np.int32)
+        self.free_pos = np.zeros((num_envs, self.max_length), dtype=np.int32)
+        self.free_count = np.zeros(num_envs, dtype=np.int64)
+        
+        self.food = np.zeros((num_envs, 2), dtype=np.int64)
+        self.directions = np.zeros(num_envs, dtype=np.int64)
+        self.steps_without_food = np.zeros(num_envs, dtype=np.int64)
+        self.food_eaten = np.zeros(num_envs, dtype=np.int64)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        
+        self.reset()
+    
+    def reset(self, indices=None):
+        """Reset the given boards (all by default) and return the batched state"""
+        if indices is None:
+            indices = self.board_index
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size == 0:
+            return self.get_state()
+            
+        start = (self.grid_width // 2, self.grid_height // 2)
+        self.occupancy[indices, 1:-1, 1:-1] = False
+        self.occupancy[indices, start[1] + 1, start[0] + 1] = True
+        self.free_cells[indices] = np.arange(self.max_length, dtype=np.int32)
+        self.free_pos[indices] = np.arange(self.max_length, dtype=np.int32)
+        self.free_count[indices] = self.max_length
+        self._take_free(indices, np.full(indices.size, start[1] * self.grid_width + start[0]))
+        self.bodies[indices, 0] = start
+        self.head_ptr[indices] = 0
+        self.lengths[indices] = 1
+        self.heads[indices] = start
+        
+        self.directions[indices] = self.rng.integers(0, 4, size=indices.size)
+        self.steps_without_food[indices] = 0
+        self.food_eaten[indices] = 0
+        self.scores[indices] = 0
+        self.episode_steps[indices] = 0
+        
+        self.spawn_food(indices)
+        return self.get_state()
+    
+    def _take_free(self, boards, cells):
+        # Vectorized WormBody._take_free; each board appears at most once
+        slots = self.free_pos[boards, cells]
+        last = self.free_count[boards] - 1
+        others = self.free_cells[boards, last]
+        self.free_cells[boards, slots] = others
+        self.free_pos[boards, others] = slots
+        self.free_cells[boards, last] = cells
+        self.free_pos[boards, cells] = last
+        self.free_count[boards] = last
+        
+    def _give_free(self, boards, cells):
+        # Vectorized WormBody._give_free; each board appears at most once
+        slots = self.free_pos[boards, cells]
+        first = self.free_count[boards]
+        others = self.free_cells[boards, first]
+        self.free_cells[boards, slots] = others
+        self.free_pos[boards, others] = slots
+        self.free_cells[boards, first] = cells
+        self.free_pos[boards, cells] = first
+        self.free_count[boards] = first + 1
+    
+    def spawn_food(self, indices):
+        """Place food on a random free cell of each given board"""
+        indices = np.asarray(indices, dtype=np.int64)
+        # A board with no free cell keeps its food under the head; the next
+        # move is then fatal, which ends the episode
+        indices = indices[self.free_count[indices] > 0]
+        slots = (self.rng.random(indices.size) * self.free_count[indices]).astype(np.int64)
+        cells = self.free_cells[indices, slots]
+        self.food[indices, 0] = cells % self.grid_width
+        self.food[indices, 1] = cells // self.grid_width
+    
+    def get_state(self):
+        """Batched equivalent of WormAI.get_state() for every board"""
+        head_x = self.heads[:, 0]
+        head_y = self.heads[:, 1]
+        width = self.grid_width
+        height = self.grid_height
+        
+        state = np.empty((self.num_envs, STATE_SIZE), dtype=np.float32)
+        state[:, 0] = head_x / width
+        state[:, 1] = (width - head_x - 1) / width
+        state[:, 2] = head_y / height
+        state[:, 3] = (height - head_y - 1) / height
+        state[:, 4] = (self.food[:, 0] - head_x) / width
+        state[:, 5] = (self.food[:, 1] - head_y) / height
+        
+        # Danger in each direction: wall or body in the neighbouring cell
+        for direction in range(4):
+            state[:, 6 + direction] = self.occupancy[
+                self.board_index,
+                head_y + 1 + self.dy[direction],
+                head_x + 1 + self.dx[direction]
+            ]
+            
+        state[:, 10] = self.lengths / self.max_length
+        return state
+    
+    def calculate_reward(self, indices):
+        """Vectorized WormGame.calculate_reward() for the given boards"""
+        heads = self.heads[indices]
+        food = self.food[indices]
+        steps_without_food = self.steps_without_food[indices]
+        
+        distance = np.abs(heads - food).sum(axis=1)
+        reward = -distance / (self.grid_width + self.grid_height)
+        reward += (heads == food).all(axis=1) * 1.0
+        reward -= (steps_without_food > 100) * 0.1
+        reward -= (steps_without_food > 200) * 0.2
+        return reward
+    
+    def step(self, actions):
+        """Advance every board by one move
+        
+        Returns (next_states, rewards, dones, info). Boards that died are
+        reset before next_states is built; their final score, length and
+        step count are reported in info.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        self.directions[:] = actions
+        
+        new_x = self.heads[:, 0] + self.dx[actions]
+        new_y = self.heads[:, 1] + self.dy[actions]
+        
+        # The tail has not moved yet, so running into it is fatal just like
+        # the `new_head in self.worm` check in WormGame.step()
+        dones = self.occupancy[self.board_index, new_y + 1, new_x + 1]
+        alive = np.flatnonzero(~dones)
+        
+        # Move heads forward
+        new_x = new_x[alive]
+        new_y = new_y[alive]
+        ptr = (self.head_ptr[alive] + 1) % self.max_length
+        self.head_ptr[alive] = ptr
+        self.bodies[alive, ptr, 0] = new_x
+        self.bodies[alive, ptr, 1] = new_y
+        self.heads[alive, 0] = new_x
+        self.heads[alive, 1] = new_y
+        self.occupancy[alive, new_y + 1, new_x + 1] = True
+        self._take_free(alive, new_y * self.grid_width + new_x)
+        self.episode_steps[alive] += 1
+        
+        ate = (new_x == self.food[alive, 0]) & (new_y == self.food[alive, 1])
+        eaters = alive[ate]
+        movers = alive[~ate]
+        
+        # Grow on food
+        self.lengths[eaters] += 1
+        self.food_eaten[eaters] += 1
+        self.scores[eaters] += 10
+        self.steps_without_food[eaters] = 0
+        self.spawn_food(eaters)
+        
+        # Otherwise drop the tail
+        tail = self.bodies[movers, (self.head_ptr[movers] - self.lengths[movers]) % self.max_length]
+        self.occupancy[movers, tail[:, 1] + 1, tail[:, 0] + 1] = False
+        self._give_free(movers, tail[:, 1] * self.grid_width + tail[:, 0])
+        self.steps_without_food[movers] += 1
+        
+        rewards = np.full(self.num_envs, DEATH_REWARD, dtype=np.float32)
+        rewards[alive] = self.calculate_reward(alive)
+        
+        info = {
+            "score": np.where(dones, self.scores, 0),
+            "length": np.where(dones, self.lengths, 0),
+            "steps": np.where(dones, self.episode_steps, 0)
+        }
+        
+        next_states = self.reset(np.flatnonzero(dones))
+        return next_states, rewards, dones, info
+    
+    def worm(self, index):
+        """Body of one board as a head-first list of (x, y) cells"""
+        ptr = self.head_ptr[index]
+        cells = self.bodies[index, (ptr - np.arange(self.lengths[index])) % self.max_length]
+        return [tuple(cell) for cell in cells.tolist()]
+
+class WormArena:
+    """Several worms sharing one board, driven by batched policy forwards
+    
+    Worms die on walls, on any body (their own or another worm's) and when
+    two heads move into the same cell. A dead worm respawns on a free cell
+    with a fresh LSTM state on the next tick; while the board has no free
+    cell it sits out, with no reward, death or transition. Worm i is driven by
+    ais[i % len(ais)], and all worms of one policy act from a single
+    batched forward per tick, so different policies can be compared on
+    the same board.
+    """
+    
+    def __init__(self, num_worms, ais, num_food=None, width=GRID_WIDTH, height=GRID_HEIGHT, learn=False):
+        self.num_worms = num_worms
+        self.ais = list(ais) if isinstance(ais, (list, tuple)) else [ais]
+        self.width = width
+        self.height = height
+        self.learn = learn
+        
+        self.board = BoardOccupancy(width, height)
+        self.worms = [WormBody(width, height, board=self.board) for _ in range(num_worms)]
+        self.foods = set()
+        
+        # Per-worm episode state
+        self.directions = np.full(num_worms, RIGHT, dtype=np.int64)
+        self.scores = np.zeros(num_worms, dtype=np.int64)
+        self.episode_steps = np.zeros(num_worms, dtype=np.int64)
+        self.steps_without_food = np.zeros(num_worms, dtype=np.int64)
+        
+        # Per-worm totals
+        self.best_scores = np.zeros(num_worms, dtype=np.int64)
+        self.total_scores = np.zeros(num_worms, dtype=np.int64)
+        self.deaths = np.zeros(num_worms, dtype=np.int64)
+        self.food_eaten = np.zeros(num_worms, dtype=np.int64)
+        
+        # Worms grouped by the policy that drives them, one hidden batch each
+        self.groups = [np.arange(p, num_worms, len(self.ais)) for p in range(len(self.ais))]
+        self.hidden = [ai.init_hidden_batch(len(group)) for ai, group in zip(self.ais, self.groups)]
+        
+        # remember() only feeds flat-replay PyTorch policies
+        for p, ai in enumerate(self.ais):
+            if learn and ai.has_ai and ai.numpy_policy is not None:
+                logging.warning(f"Arena policy {p} is a NumPy policy and will not learn")
+            elif learn and ai.has_ai and ai.sequence_replay:
+                logging.warning(f"Arena policy {p} uses sequence replay and will not learn")
+        
+        self.ticks = 0
+        self.tick_latency = RollingStats()
+        
+        for index in range(num_worms):
+            self.spawn_worm(index)
+        # Worms on the board this tick; the rest wait for a free cell
+        self.active = np.array([bool(worm) for worm in self.worms])
+        for _ in range(num_food or num_worms):
+            self.spawn_food()
+            
+    def random_empty_cell(self):
+        """Random cell with neither a worm nor food on it, or None"""
+        cell = None
+        for _ in range(8):
+            cell = self.board.random_free_cell()
+            if cell is None or cell not in self.foods:
+                break
+        return cell
+    
+    def spawn_food(self):
+        cell = self.random_empty_cell()
+        if cell is not None:
+            self.foods.add(cell)
+            
+    def spawn_worm(self, index):
+        """Start a new episode for one worm; it waits if the board is full"""
+        self.worms[index].clear()
+        cell = self.random_empty_cell()
+        if cell is not None:
+            self.worms[index].push_head(cell)
+        self.directions[index] = RIGHT
+        self.scores[index] = 0
+        self.episode_steps[index] = 0
+        self.steps_without_food[index] = 0
+        
+    def nearest_food(self, head):
+        if not self.foods:
+            return head
+        head_x, head_y = head
+        return min(self.foods, key=lambda food: abs(food[0] - head_x) + abs(food[1] - head_y))
+    
+    def get_states(self, ai, group):
+        """Stacked WormAI.get_state() rows for one policy's worms"""
+        states = np.zeros((len(group), STATE_SIZE), dtype=np.float32)
+        for row, index in enumerate(group):
+            worm = self.worms[index]
+            if worm:
+                states[row] = ai.get_state(worm, self.nearest_food(worm[0]))
+        return states
+    
+    def calculate_reward(self, index, head, food, ate):
+        """WormGame.calculate_reward() against the worm's nearest food"""
+        distance = abs(head[0] - food[0]) + abs(head[1] - food[1])
+        reward = -distance / (self.width + self.height)
+        if ate:
+            reward += 1.0
+        if self.steps_without_food[index] > 100:
+            reward -= 0.1
+        if self.steps_without_food[index] > 200:
+            reward -= 0.2
+        return reward
+    
+    def step(self):
+        """Advance every worm by one move; returns (rewards, dones)
+        
+        Waiting worms (not in self.active) get a reward of 0 and are not done.
+        """
+        start = time.perf_counter()
+        self.ticks += 1
+        
+        # Respawn worms that were waiting for room
+        for index in range(self.num_worms):
+            if not self.worms[index]:
+                self.spawn_worm(index)
+        active = self.active = np.array([bool(worm) for worm in self.worms])
+                
+        # One batched forward per policy
+        states = []
+        actions = np.empty(self.num_worms, dtype=np.int64)
+        for p, (ai, group) in enumerate(zip(self.ais, self.groups)):
+            group_states = self.get_states(ai, group) if ai.has_ai else None
+            actions[group], _, self.hidden[p] = ai.choose_actions(group_states, self.directions[group], self.hidden[p])
+            states.append(group_states)
+        self.directions[:] = actions
+        
+        # Target cells; tails have not moved yet, so as in WormGame.step()
+        # running into any body cell is fatal
+        targets = []
+        for index, worm in enumerate(self.worms):
+            if worm:
+                head_x, head_y = worm[0]
+                targets.append((head_x + DIRECTION_DX[actions[index]], head_y + DIRECTION_DY[actions[index]]))
+            else:
+                targets.append(None)
+        claims = {}
+        for target in targets:
+            claims[target] = claims.get(target, 0) + 1
+        dones = np.array([target is not None and (claims[target] > 1 or self.board.is_blocked(*target))
+                          for target in targets])
+        
+        # Move survivors, dropping tails only after every head has moved
+        rewards = np.where(dones, DEATH_REWARD, 0.0).astype(np.float32)
+        eaten = 0
+        movers = []
+        for index in np.flatnonzero(active & ~dones):
+            head = targets[index]
+            food = self.nearest_food(head)
+            ate = head in self.foods
+            self.worms[index].push_head(head)
+            self.episode_steps[index] += 1
+            if ate:
+                self.foods.discard(head)
+                eaten += 1
+                self.scores[index] += 10
+                self.food_eaten[index] += 1
+                self.steps_without_food[index] = 0
+            else:
+                movers.append(index)
+                self.steps_without_food[index] += 1
+            rewards[index] = self.calculate_reward(index, head, food, ate)
+        for index in movers:
+            self.worms[index].pop_tail()
+            
+        # Dead worms leave the board right away
+        dead = np.flatnonzero(dones)
+        for index in dead:
+            self.worms[index].clear()
+            self.deaths[index] += 1
+            self.total_scores[index] += self.scores[index]
+            self.best_scores[index] = max(self.best_scores[index], self.scores[index])
+            
+        for _ in range(eaten):
+            self.spawn_food()
+            
+        if self.learn:
+            self.remember(states, actions, rewards, dones, active)
+            
+        # Fresh episodes and LSTM states for the dead; waiting worms keep a
+        # fresh state until they are back on the board
+        for p, (ai, group) in enumerate(zip(self.ais, self.groups)):
+            ai.reset_hidden_rows(self.hidden[p], np.flatnonzero(dones[group] | ~active[group]))
+        for index in dead:
+            self.spawn_worm(index)
+            
+        self.tick_latency.add(time.perf_counter() - start)
+        return rewards, dones
+    
+    def remember(self, states, actions, rewards, dones, active):
+        """Feed this tick's transitions of the active worms to the flat-replay policies and learn"""
+        for ai, group, group_states in zip(self.ais, self.groups, states):
+            if not ai.has_ai or ai.numpy_policy is not None or ai.sequence_replay:
+                continue
+            next_states = self.get_states(ai, group)
+            for row, index in enumerate(group):
+                if not active[index]:
+                    continue
+                ai.remember(group_states[row], actions[index], rewards[index], next_states[row], bool(dones[index]))
+            ai.learn()
+            
+    def summary(self):
+        """Per-policy totals: deaths, mean finished score, best score, food"""
+        results = []
+        for p, group in enumerate(self.groups):
+            deaths = int(self.deaths[group].sum())
+            results.append({
+                "policy": p,
+                "worms": len(group),
+                "deaths": deaths,
+                "mean_score": float(self.total_scores[group].sum() / max(deaths, 1)),
+                "best_score": int(self.best_scores[group].max(initial=0)),
+                "food_eaten": int(self.food_eaten[group].sum())
+            })
+        return results
+    
+    def run(self, ticks=None, log_every=10000):
+        """Step the arena as fast as possible and print a per-policy summary"""
+        start = time.perf_counter()
+        tick = 0
+        try:
+            while ticks is None or tick < ticks:
+                self.step()
+                tick += 1
+                if log_every and tick % log_every == 0:
+                    elapsed = time.perf_counter() - start
+                    logging.info(f"Arena tick {tick}: {tick / elapsed:.0f} ticks/s, {self.deaths.sum()} deaths")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"Arena ran {tick} ticks with {self.num_worms} worms in {elapsed:.1f}s "
+                  f"({tick / elapsed:.0f} ticks/s, {tick * self.num_worms / elapsed:.0f} worm-steps/s)")
+            for result in self.summary():
+                print(f"Policy {result['policy']}: {result}")
+            print(f"Tick latency: {self.tick_latency.summary()}")
+
+class SharedReplayStorage(ReplayStorage):
+    """ReplayStorage whose arrays live in named shared memory
+    
+    The learner creates and unlinks the segments; actor processes it
+    spawns attach to them by prefix. Each of the num_actors stripes of
+    the ring belongs to one actor, which publishes its progress in
+    `counters` (rows written, finished episodes and their summed score,
+    one row per actor).
+    """
+    
+    def __init__(self, capacity, num_actors, state_size=STATE_SIZE, prefix=None, create=True):
+        self.prefix = prefix or f"worm_replay_{os.getpid()}_{random.getrandbits(32):08x}"
+        self.create = create
+        self.num_actors = num_actors
+        self.stripe_size = capacity // num_actors
+        self.segments = []
+        super().__init__(self.stripe_size * num_actors, state_size)
+        self.counters = self.allocate("counters", (num_actors, 3), np.int64)
+        
+    @classmethod
+    def attach(cls, layout):
+        """Open the segments described by another process's layout()"""
+        return cls(layout["capacity"], layout["num_actors"], layout["state_size"], layout["prefix"], create=False)
+        
+    def layout(self):
+        """Picklable description that attach() accepts"""
+        return {"capacity": self.capacity, "num_actors": self.num_actors,
+                "state_size": self.state_size, "prefix": self.prefix}
+                
+    def allocate(self, name, shape, dtype):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        segment = shared_memory.SharedMemory(name=f"{self.prefix}_{name}", create=self.create, size=size)
+        self.segments.append(segment)
+        array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        if self.create:
+            array.fill(0)
+        return array
+        
+    def stripe_slots(self, actor, start, count):
+        """Ring slots for an actor's writes number start .. start + count - 1"""
+        return actor * self.stripe_size + (start + np.arange(count)) % self.stripe_size
+        
+    def close(self):
+        # Views must go before their buffers can be released
+        self.states = self.next_states = self.actions = self.rewards = self.dones = self.counters = None
+        for segment in self.segments:
+            segment.close()
+            if self.create:
+                segment.unlink()
+        self.segments = []
+
+class ApexReplayBuffer(PrioritizedReplayBuffer):
+    """Learner-side prioritized view over a SharedReplayStorage
+    
+    Actors only write rows; sync() picks up what they wrote since the last
+    call and gives the new slots the maximum priority, so the sum tree
+    stays private to the learner. A row an actor overwrites while it is
+    being sampled is a lost sample, as in Ape-X, not an error.
+    """
+    
+    def __init__(self, storage, alpha=PER_ALPHA, beta_start=PER_BETA_START, beta_frames=PER_BETA_FRAMES):
+        super().__init__(storage.capacity, alpha, beta_start, beta_frames, storage=storage)
+        self.seen = np.zeros(storage.num_actors, dtype=np.int64)
+        self.filled = np.zeros(storage.num_actors, dtype=np.int64)
+        
+    def sync(self):
+        """Register rows written by actors; returns how many arrived"""
+        writes = self.storage.counters[:, 0].copy()
+        for actor in np.flatnonzero(writes > self.seen):
+            # Only the newest stripe_size rows can still be in the ring
+            start = max(self.seen[actor], writes[actor] - self.storage.stripe_size)
+            count = int(writes[actor] - start)
+            slots = self.storage.stripe_slots(actor, start, count)
+            self.tree.update(slots, np.full(count, self.max_priority ** self.alpha))
+        arrived = int((writes - self.seen).sum())
+        self.seen = writes
+        self.filled = np.minimum(writes, self.storage.stripe_size)
+        self.size = int(self.filled.sum())
+        return arrived
+        
+    def clip_indices(self, indices):
+        # Keep rounding overshoot inside the written part of each stripe
+        stripe_size = self.storage.stripe_size
+        actors = indices // stripe_size
+        filled = self.filled[actors]
+        offsets = np.minimum(indices % stripe_size, np.maximum(filled - 1, 0))
+        fallback = int(np.argmax(self.filled))
+        return np.where(filled > 0, actors * stripe_size + offsets,
+                        fallback * stripe_size + self.filled[fallback] - 1)
+                        
+    def add(self, *transition):
+        raise NotImplementedError("Ape-X actors write into the shared storage")
+        
+    def add_batch(self, *transitions):
+        raise NotImplementedError("Ape-X actors write into the shared storage")
+
+class SharedWeights:
+    """Flat float32 copy of a model's parameters in shared memory
+    
+    A seqlock guards the copy: the version is odd while the learner is
+    writing, so actors skip a half-written network instead of loading it.
+    """
+    
+    def __init__(self, model, name=None, create=True):
+        self.create = create
+        self.count = sum(parameter.numel() for parameter in model.parameters())
+        self.segment = shared_memory.SharedMemory(name=name, create=create, size=8 + 4 * self.count)
+        self.name = self.segment.name
+        self.version = np.ndarray((1,), dtype=np.int64, buffer=self.segment.buf)
+        self.values = np.ndarray((self.count,), dtype=np.float32, buffer=self.segment.buf, offset=8)
+        if create:
+            self.version[0] = 0
+            self.publish(model)
+            
+    def publish(self, model):
+        self.version[0] += 1
+        with torch.no_grad():
+            self.values[:] = nn.utils.parameters_to_vector(model.parameters()).numpy()
+        self.version[0] += 1
+        
+    def fetch(self, model, known_version):
+        """Load newer weights into model; returns the version now held"""
+        version = int(self.version[0])
+        if version == known_version or version % 2:
+            return known_version
+        values = self.values.copy()
+        if int(self.version[0]) != version:
+            return known_version
+        with torch.no_grad():
+            nn.utils.vector_to_parameters(torch.from_numpy(values), model.parameters())
+        return version
+        
+    def close(self):
+        self.version = self.values = None
+        self.segment.close()
+        if self.create:
+            self.segment.unlink()
+
+def apex_epsilon(actor, num_actors):
+    """Exploration rate of one actor under the Ape-X schedule"""
+    if num_actors == 1:
+        return APEX_EPSILON_BASE
+    return APEX_EPSILON_BASE ** (1 + APEX_EPSILON_ALPHA * actor / (num_actors - 1))
+
+def run_apex_actor(actor, layout, weights_name, stop, num_envs=APEX_ENVS_PER_ACTOR, seed=None, hyperparameters=None):
+    """Actor process: step a WormVecEnv at a fixed epsilon and write into shared replay
+    
+    hyperparameters are the learner's, so the network matches SharedWeights.
+    """
+    torch.set_num_threads(1)
+    storage = SharedReplayStorage.attach(layout)
+    # Actors write into shared replay and never use a buffer of their own
+    hyperparameters = {**(hyperparameters or {}), "replay_size": BATCH_SIZE}
+    ai = WormAI(**hyperparameters)
+    ai.epsilon = apex_epsilon(actor, storage.num_actors)
+    weights = SharedWeights(ai.policy_net, weights_name, create=False)
+    version = weights.fetch(ai.policy_net, -1)
+    
+    env = WormVecEnv(num_envs, seed=seed)
+    states = env.reset()
+    hidden = ai.init_hidden_batch(num_envs)
+    writes = int(storage.counters[actor, 0])
+    steps = 0
+    
+    try:
+        while not stop.is_set():
+            actions, _, hidden = ai.choose_actions(states, env.directions, hidden)
+            next_states, rewards, dones, info = env.step(actions)
+            
+            # Rows first, then the counter the learner polls
+            storage.write_batch(storage.stripe_slots(actor, writes, num_envs),
+                                states, actions, rewards, next_states, dones)
+            writes += num_envs
+            storage.counters[actor, 0] = writes
+            
+            finished = np.flatnonzero(dones)
+            if finished.size:
+                storage.counters[actor, 1] += finished.size
+                storage.counters[actor, 2] += int(info["score"][finished].sum())
+                ai.reset_hidden_rows(hidden, finished)
+            states = next_states
+            
+            steps += 1
+            if steps % APEX_SYNC_EVERY == 0:
+                version = weights.fetch(ai.policy_net, version)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        weights.close()
+        storage.close()
+
+class ApexTrainer:
+    """Ape-X style training: actor processes fill shared replay, this process learns
+    
+    Each actor runs a WormVecEnv on its own core with its own epsilon and
+    writes into its stripe of a SharedReplayStorage. The learner samples
+    it with prioritized replay through the usual WormAI.learn() and
+    broadcasts policy_net weights every APEX_PUBLISH_EVERY updates.
+    """
+    
+    def __init__(self, num_actors, ai=None, capacity=APEX_MEMORY_SIZE, num_envs=APEX_ENVS_PER_ACTOR):
+        self.num_actors = num_actors
+        self.num_envs = num_envs
+        self.ai = ai if ai is not None else WormAI()
+        if self.ai.sequence_replay:
+            # Actors write flat transitions; learn() would expect sequences
+            raise ValueError("Ape-X training does not support sequence replay")
+        self.storage = SharedReplayStorage(capacity, num_actors)
+        self.ai.memory = ApexReplayBuffer(self.storage)
+        self.weights = SharedWeights(self.ai.policy_net)
+        
+        # Spawned rather than forked so actors do not inherit torch's thread pools
+        self.context = multiprocessing.get_context("spawn")
+        self.stop = self.context.Event()
+        self.actors = []
+        
+    def start(self):
+        for actor in range(self.num_actors):
+            process = self.context.Process(
+                target=run_apex_actor,
+                args=(actor, self.storage.layout(), self.weights.name, self.stop, self.num_envs, actor,
+                      self.ai.hyperparameters()),
+                daemon=True
+            )
+            process.start()
+            self.actors.append(process)
+        return self
+        
+    def train(self, updates=None, log_every=1000):
+        """Learn until `updates` updates are done, or until interrupted if None"""
+        memory = self.ai.memory
+        start = time.perf_counter()
+        update = 0
+        
+        try:
+            while updates is None or update < updates:
+                memory.sync()
+                if len(memory) < self.ai.batch_size:
+                    time.sleep(0.01)
+                    continue
+                    
+                # learn() logs and skips a failed update; only count real ones
+                learned = self.ai.learn_step_counter
+                self.ai.learn()
+                if self.ai.learn_step_counter == learned:
+                    continue
+                update += 1
+                if update % APEX_PUBLISH_EVERY == 0:
+                    self.weights.publish(self.ai.policy_net)
+                if log_every and update % log_every == 0:
+                    logging.info(f"Ape-X update {update}: {self.summary()}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            stats = self.summary()
+            print(f"Ape-X learner: {update} updates in {elapsed:.1f}s ({update / elapsed:.0f} updates/s), "
+                  f"{stats['transitions']} transitions ({stats['transitions'] / elapsed:.0f}/s) "
+                  f"from {self.num_actors} actors, {stats['episodes']} episodes, "
+                  f"mean score {stats['mean_score']:.2f}")
+                  
+    def summary(self):
+        counters = self.storage.counters
+        episodes = int(counters[:, 1].sum())
+        return {
+            "transitions": int(counters[:, 0].sum()),
+            "episodes": episodes,
+            "mean_score": float(counters[:, 2].sum() / max(episodes, 1))
+        }
+        
+    def close(self):
+        self.stop.set()
+        for process in self.actors:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.actors = []
+        self.weights.close()
+        self.storage.close()
+
+class TransitionShardWriter:
+    """Writes transitions to numbered .npz shards of shard_size rows each"""
+    
+    def __init__(self, directory, shard_size=OFFLINE_SHARD_SIZE):
+        self.directory = directory
+        self.shard_size = shard_size
+        os.makedirs(directory, exist_ok=True)
+        self.shards = len([name for name in os.listdir(directory) if name.endswith(".npz")])
+        self.pending = []
+        self.pending_rows = 0
+        self.rows = 0
+        
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        self.pending.append((states, actions, rewards, next_states, dones))
+        self.pending_rows += len(actions)
+        while self.pending_rows >= self.shard_size:
+            self.flush(self.shard_size)
+            
+    def flush(self, rows=None):
+        """Write up to `rows` pending transitions (all if None) as one shard"""
+        if not self.pending_rows:
+            return
+        fields = [np.concatenate(field) for field in zip(*self.pending)]
+        rows = min(rows or self.pending_rows, self.pending_rows)
+        path = os.path.join(self.directory, f"shard_{self.shards:05d}.npz")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **{name: field[:rows] for name, field in zip(TRANSITION_FIELDS, fields)})
+        os.replace(tmp_path, path)
+        self.shards += 1
+        self.rows += rows
+        self.pending = [tuple(field[rows:] for field in fields)]
+        self.pending_rows -= rows
+        
+    def close(self):
+        self.flush()
+        logging.info(f"Wrote {self.rows} transitions to {self.shards} shards in {self.directory}")
+
+def recording_transitions(path, ai):
+    """Rebuild one chunk of transitions per recorded episode
+    
+    Each episode is replayed through WormGame.step() with the same state
+    and reward code as live play. Wall and self deaths become terminal
+    transitions with DEATH_REWARD, as in WormVecEnv.
+    """
+    recording = EpisodeRecording(path)
+    game = WormGame(headless=True, ai=ai)
+    for index in range(len(recording)):
+        player = EpisodePlayer(game, recording.episode(index))
+        states = [ai.get_state(game.worm, game.food)]
+        actions, rewards, dones = [], [], []
+        while not player.finished:
+            action = int(player.episode["actions"][player.position])
+            player.advance(1)
+            if player.cause == "full":
+                break
+            actions.append(action)
+            if player.cause is not None:
+                states.append(states[-1])
+                rewards.append(DEATH_REWARD)
+                dones.append(1.0)
+                break
+            rewards.append(game.calculate_reward(game.worm[0]))
+            dones.append(0.0)
+            states.append(ai.get_state(game.worm, game.food))
+        if actions:
+            states = np.array(states, dtype=np.float32)
+            yield (states[:-1], np.array(actions, dtype=np.int64), np.array(rewards, dtype=np.float32),
+                   states[1:], np.array(dones, dtype=np.float32))
+
+def transition_chunks(source, ai=None, chunk_size=OFFLINE_SHARD_SIZE):
+    """Stream (states, actions, rewards, next_states, dones) chunks from one source
+    
+    A source is an .npz shard, a directory of shards, a memmap replay
+    directory (--replay-dir) or an episode recording (.wrec).
+    """
+    if source.endswith(".wrec"):
+        yield from recording_transitions(source, ai)
+    elif os.path.exists(os.path.join(source, "meta.json")):
+        with open(os.path.join(source, "meta.json"), "r", encoding="utf-8") as f:
+            size = json.load(f)["size"]
+        fields = [np.load(os.path.join(source, f"{name}.npy"), mmap_mode="r") for name in TRANSITION_FIELDS]
+        for start in range(0, size, chunk_size):
+            yield tuple(np.array(field[start:start + chunk_size]) for field in fields)
+    elif os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith(".npz"):
+                yield from transition_chunks(os.path.join(source, name), ai, chunk_size)
+    else:
+        with np.load(source) as shard:
+            yield tuple(shard[name] for name in TRANSITION_FIELDS)
+
+def shuffled_batches(chunks, batch_size, buffer_size, rng):
+    """Draw uniformly shuffled batches from chunks streamed through a fixed-size buffer
+    
+    Once the buffer is full, each batch is drawn from random slots, which
+    the next incoming rows then refill. The buffer is drained at the end;
+    a last batch smaller than batch_size is dropped.
+    """
+    buffer = None
+    filled = 0
+    for chunk in chunks:
+        if buffer is None:
+            buffer = [np.empty((buffer_size,) + field.shape[1:], dtype=field.dtype) for field in chunk]
+        start = 0
+        rows = len(chunk[1])
+        while start < rows:
+            if filled < buffer_size:
+                count = min(buffer_size - filled, rows - start)
+                slots = slice(filled, filled + count)
+                filled += count
+            else:
+                count = min(batch_size, rows - start)
+                slots = rng.choice(buffer_size, count, replace=False)
+                yield tuple(field[slots] for field in buffer)
+            for field, values in zip(buffer, chunk):
+                field[slots] = values[start:start + count]
+            start += count
+            
+    if buffer is not None:
+        order = rng.permutation(filled)
+        for start in range(0, filled - batch_size + 1, batch_size):
+            slots = order[start:start + batch_size]
+            yield tuple(field[slots] for field in buffer)
+
+def prefetch(iterable, depth):
+    """Iterate on a worker thread, keeping up to `depth` items ready"""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def worker():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            items.put(done)
+        except Exception as e:
+            # Hand the error to the consumer instead of dying silently
+            items.put(e)
+            
+    thread = threading.Thread(target=worker, name="offline-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+class OfflineTrainer:
+    """Trains a WormAI from transitions on disk instead of live play
+    
+    Sources are read chunk by chunk, pass through a shuffle buffer and are
+    batched on a prefetch thread. The main thread runs the same Double DQN
+    update as WormAI.learn(), with uniform weights instead of priorities.
+    """
+    
+    def __init__(self, ai, sources, batch_size=OFFLINE_BATCH_SIZE, shuffle_size=OFFLINE_SHUFFLE_SIZE,
+                 prefetch_depth=OFFLINE_PREFETCH, epochs=1, seed=None):
+        self.ai = ai
+        self.sources = sources
+        self.batch_size = batch_size
+        self.shuffle_size = max(shuffle_size, batch_size)
+        self.prefetch_depth = prefetch_depth
+        self.epochs = epochs
+        self.rng = np.random.default_rng(seed)
+        
+    def chunks(self):
+        for _ in range(self.epochs):
+            for source in self.sources:
+                yield from transition_chunks(source, self.ai)
+                
+    def batches(self):
+        return prefetch(shuffled_batches(self.chunks(), self.batch_size, self.shuffle_size, self.rng),
+                        self.prefetch_depth)
+                        
+    def train(self, updates=None, log_every=1000):
+        """Update until the sources are exhausted or `updates` updates are done"""
+        ai = self.ai
+        start = time.perf_counter()
+        update = 0
+        
+        try:
+            for batch in self.batches():
+                states, actions, rewards, next_states, dones = (torch.from_numpy(field) for field in batch)
+                current_q_values, target_q_values = ai.double_dqn_targets(states, actions, rewards, next_states, dones)
+                ai.optimize(F.smooth_l1_loss(current_q_values, target_q_values))
+                update += 1
+                if log_every and update % log_every == 0:
+                    logging.info(f"Offline update {update}: {update * self.batch_size / (time.perf_counter() - start):.0f} "
+                                 f"transitions/s")
+                if updates is not None and update >= updates:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"Offline training: {update} updates of {self.batch_size} in {elapsed:.1f}s "
+                  f"({update / elapsed:.0f} updates/s, {update * self.batch_size / elapsed:.0f} transitions/s)")
+        return update
+
+# WormAI and WormGame of an evaluation worker process (init_evaluation_worker)
+evaluation_worker = None
+
+def init_evaluation_worker(policy):
+    """Load the policy once per worker process; greedy, single-threaded"""
+    global evaluation_worker
+    if HAS_TORCH:
+        torch.set_num_threads(1)
+    # Read once: it sizes the network and then fills it
+    checkpoint = WormAI.read_checkpoint(policy["checkpoint"]) if policy.get("checkpoint") else None
+    ai = WormAI(numpy_weights=policy.get("numpy"), **(checkpoint or {}).get("hyperparameters", {}))
+    if checkpoint is not None:
+        ai.load_checkpoint(policy["checkpoint"], checkpoint)
+    ai.epsilon = 0.0
+    evaluation_worker = (ai, WormGame(headless=True, ai=ai))
+
+def evaluate_episode(ai, game, seed, starvation_cap=EVAL_STARVATION_STEPS):
+    """Play one greedy episode from seed; returns its score, length and cause of death"""
+    # choose_action() breaks up 180-degree turns with the global RNG
+    random.seed(seed)
+    game.reset_game(seed=seed)
+    steps = 0
+    cause = None
+    while cause is None:
+        state = ai.get_state(game.worm, game.food)
+        action, _, _ = ai.choose_action(state, game.direction)
+        cause = game.step(action)
+        steps += 1
+        if cause is None and starvation_cap and game.steps_without_food >= starvation_cap:
+            cause = "starved"
+    return {"seed": seed, "score": game.score, "steps": steps, "length": len(game.worm), "cause": cause}
+
+def evaluate_seeds(seeds, starvation_cap=EVAL_STARVATION_STEPS):
+    """Pool task: evaluate a run of seeds with this worker's policy"""
+    ai, game = evaluation_worker
+    return [evaluate_episode(ai, game, seed, starvation_cap) for seed in seeds]
+
+def evaluate_policy(policy, seeds, workers=None, starvation_cap=EVAL_STARVATION_STEPS):
+    """Greedy episodes for every seed, spread over a pool of worker processes
+    
+    policy is {"checkpoint": path} or {"numpy": path}. Episodes depend
+    only on the policy and their seed, so results do not change with the
+    number of workers. Returns one result per seed, in seed order.
+    """
+    path = policy.get("checkpoint") or policy.get("numpy")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No policy to evaluate at {path}")
+    workers = workers or os.cpu_count() or 1
+    tasks = [seeds[start:start + EVAL_SEEDS_PER_TASK] for start in range(0, len(seeds), EVAL_SEEDS_PER_TASK)]
+    
+    if workers == 1:
+        init_evaluation_worker(policy)
+        results = [evaluate_seeds(task, starvation_cap) for task in tasks]
+    else:
+        # Spawned for the same reason as the Ape-X actors
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=init_evaluation_worker, initargs=(policy,)) as pool:
+            results = pool.starmap(evaluate_seeds, [(task, starvation_cap) for task in tasks])
+    return sorted((result for task in results for result in task), key=lambda result: result["seed"])
+
+def evaluation_report(results):
+    """Mean, median and p95 of score, steps and final length, plus death-cause counts"""
+    report = {"episodes": len(results)}
+    for field in ("score", "steps", "length"):
+        values = np.array([result[field] for result in results], dtype=np.float64)
+        report[field] = {
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "p95": float(np.percentile(values, 95))
+        }
+    report["causes"] = {cause: sum(result["cause"] == cause for result in results) for cause in DEATH_CAUSES[1:]}
+    return report
+
+def run_sweep_trial(path, hyperparameters, steps, seeds, starvation_cap=EVAL_STARVATION_STEPS):
+    """Pool task: train one trial `steps` more env steps from its checkpoint, then score it greedily"""
+    torch.set_num_threads(1)
+    ai = WormAI(**hyperparameters)
+    if os.path.exists(path):
+        ai.load_checkpoint(path)
+    ai.enable_checkpoints(path, 0, include_replay=True)
+    game = WormGame(headless=True, ai=ai)
+    
+    start = time.perf_counter()
+    for _ in range(steps):
+        game.update()
+        if game.game_over:
+            game.reset_game()
+    ai.close_checkpoints()
+    elapsed = time.perf_counter() - start
+    
+    ai.epsilon = 0.0
+    results = [evaluate_episode(ai, game, seed, starvation_cap) for seed in seeds]
+    scores = [result["score"] for result in results]
+    return {
+        "score": float(np.mean(scores)),
+        "median_score": float(np.median(scores)),
+        "episode_steps": float(np.mean([result["steps"] for result in results])),
+        "train_steps": ai.env_steps,
+        "seconds": elapsed
+    }
+
+class SweepRunner:
+    """Successive-halving search over WormAI hyperparameters in worker processes
+    
+    Every configuration trains headlessly for the first rung's budget and
+    is scored on the same greedy evaluation seeds. The best 1/eta carry on
+    from their checkpoints (replay included) to an eta times larger
+    budget, until the survivors of the last rung have trained `budget`
+    env steps. Each trial runs single-threaded in a spawned pool worker.
+    """
+    
+    def __init__(self, space=SWEEP_SPACE, mode="grid", trials=SWEEP_TRIALS, budget=SWEEP_BUDGET, eta=SWEEP_ETA,
+                 min_budget=SWEEP_MIN_BUDGET, workers=None, eval_episodes=SWEEP_EVAL_EPISODES,
+                 starvation_cap=EVAL_STARVATION_STEPS, directory="sweep", seed=None):
+        if not HAS_TORCH:
+            raise RuntimeError("Hyperparameter sweeps need PyTorch")
+        self.budget = budget
+        self.eta = eta
+        self.min_budget = min_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.seeds = list(range(eval_episodes))
+        self.starvation_cap = starvation_cap
+        self.directory = directory
+        self.configs = self.sample_configs(space, mode, trials, random.Random(seed))
+        self.rows = []
+    
+    @staticmethod
+    def sample_configs(space, mode, trials, rng):
+        """Every combination in grid mode, otherwise `trials` random draws"""
+        names = list(space)
+        if mode == "grid":
+            return [dict(zip(names, values)) for values in product(*(space[name] for name in names))]
+        return [{name: rng.choice(space[name]) for name in names} for _ in range(trials)]
+    
+    def budgets(self):
+        """Total env steps trained by the end of each rung"""
+        rungs = 1
+        while self.eta ** rungs <= len(self.configs) and self.budget / self.eta ** rungs >= self.min_budget:
+            rungs += 1
+        return [int(self.budget / self.eta ** (rungs - 1 - rung)) for rung in range(rungs)]
+    
+    def checkpoint_path(self, trial):
+        return os.path.join(self.directory, f"trial_{trial:04d}.pt")
+    
+    def run(self):
+        """Run every rung; returns the row of the best trial in the last one"""
+        os.makedirs(self.directory, exist_ok=True)
+        budgets = self.budgets()
+        survivors = list(range(len(self.configs)))
+        trained = [0] * len(self.configs)
+        print(f"Sweep: {len(self.configs)} trials, rungs at {budgets} env steps, {self.workers} workers")
+        
+        # Spawned for the same reason as the Ape-X actors
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(self.workers) as pool:
+            for rung, budget in enumerate(budgets):
+                start = time.perf_counter()
+                tasks = [(self.checkpoint_path(trial), self.configs[trial], budget - trained[trial],
+                          self.seeds, self.starvation_cap) for trial in survivors]
+                results = pool.starmap(run_sweep_trial, tasks, chunksize=1)
+                
+                ranked = []
+                for trial, result in zip(survivors, results):
+                    trained[trial] = budget
+                    row = {"trial": trial, "rung": rung, **result, **self.configs[trial]}
+                    self.rows.append(row)
+                    ranked.append(row)
+                ranked.sort(key=lambda row: (row["score"], row["episode_steps"]), reverse=True)
+                
+                keep = max(1, len(ranked) // self.eta)
+                survivors = [row["trial"] for row in ranked[:keep]]
+                self.write_table()
+                print(f"Rung {rung}: {len(ranked)} trials at {budget} steps in {time.perf_counter() - start:.0f}s, "
+                      f"best score {ranked[0]['score']:.2f} (trial {ranked[0]['trial']})"
+                      + (f", keeping {keep}" if rung < len(budgets) - 1 else ""))
+        return ranked[0]
+    
+    def write_table(self, path=None):
+        """Write every trial's results per rung as CSV, best first"""
+        path = path or os.path.join(self.directory, "results.csv")
+        rows = sorted(self.rows, key=lambda row: (row["rung"], row["score"], row["episode_steps"]), reverse=True)
+        columns = list(rows[0]) if rows else []
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(",".join(columns) + "\n")
+            for row in rows:
+                f.write(",".join(str(row[column]) for column in columns) + "\n")
+        os.replace(tmp_path, path)
+
+def parse_sweep_param(text):
+    """NAME=V1,V2,... from the command line, typed like the SWEEP_SPACE defaults"""
+    name, _, values = text.partition("=")
+    if name not in SWEEP_SPACE or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... with NAME one of {', '.join(SWEEP_SPACE)}")
+    kind = type(SWEEP_SPACE[name][0])
+    return name, [kind(value) for value in values.split(",")]
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worm Game")
+    parser.add_argument("--headless", action="store_true",
+                        help="train without a window at uncapped speed")
+    parser.add_argument("--train-steps", type=int, default=0, metavar="N",
+                        help="number of headless training steps (implies --headless)")
+    parser.add_argument("--preview-every", type=int, default=0, metavar="K",
+                        help="render a preview frame every K headless steps")
+    # Alternative replay buffers
+    replay_kind = parser.add_mutually_exclusive_group()
+    replay_kind.add_argument("--sequence-replay", action="store_true",
+                        help="train the LSTM on replayed sequences with burn-in")
+    parser.add_argument("--traced-policy", action="store_true",
+                        help="act through a TorchScript-traced copy of the policy network")
+    parser.add_argument("--numpy-policy", default=None, metavar="FILE",
+                        help="act with exported NumPy weights instead of PyTorch (no learning)")
+    parser.add_argument("--export-numpy", default=None, metavar="FILE",
+                        help="write the policy weights to a NumPy .npz on exit")
+    parser.add_argument("--arena", type=int, default=0, metavar="K",
+                        help="run K worms on one shared board headlessly (ticks from --train-steps)")
+    parser.add_argument("--apex-actors", type=int, default=0, metavar="N",
+                        help="Ape-X training with N actor processes (updates from --train-steps)")
+    parser.add_argument("--learner-thread", action="store_true",
+                        help="update the network on a background thread instead of once per step")
+    parser.add_argument("--learner-ratio", type=float, default=LEARNER_TRAIN_RATIO, metavar="R",
+                        help="background learner updates per env step (0 = as fast as possible)")
+    replay_kind.add_argument("--replay-dir", default=None, metavar="DIR",
+                        help="keep the replay buffer in memory-mapped files under DIR and resume it")
+    parser.add_argument("--replay-size", type=int, default=MEMORY_SIZE, metavar="N",
+                        help="replay buffer capacity in transitions")
+    replay_kind.add_argument("--compact-replay", action="store_true",
+                        help="store replay observations once each, quantized and bit-packed")
+    parser.add_argument("--checkpoint", default=None, metavar="FILE",
+                        help=f"save checkpoints to FILE (default {CHECKPOINT_PATH} with --resume)")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, metavar="N",
+                        help="env steps between periodic checkpoints (0 = only on exit)")
+    parser.add_argument("--checkpoint-replay", action="store_true",
+                        help="include the replay buffer contents in checkpoints (kept on by --resume "
+                             "of a checkpoint that has them)")
+    parser.add_argument("--resume", action="store_true",
+                        help="load the checkpoint before starting")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each frame phase (press P in-game for the overlay)")
+    parser.add_argument("--profile-export", default=None, metavar="FILE",
+                        help="append phase timings to FILE (.jsonl or .csv); implies --profile")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="append every episode (seed and actions) to a compressed recording")
+    parser.add_argument("--record-q", action="store_true",
+                        help="also record the Q-values behind each action")
+    parser.add_argument("--play", default=None, metavar="FILE",
+                        help="watch episodes from a recording instead of playing")
+    parser.add_argument("--episode", type=int, default=0, metavar="N",
+                        help="recorded episode to start watching from")
+    parser.add_argument("--offline", nargs="+", default=None, metavar="SOURCE",
+                        help="train from shards, replay directories or recordings, then write a checkpoint")
+    parser.add_argument("--offline-epochs", type=int, default=1, metavar="N",
+                        help="passes over the offline sources (updates capped by --train-steps)")
+    parser.add_argument("--write-shards", default=None, metavar="DIR",
+                        help="convert the --offline sources to .npz shards in DIR instead of training")
+    parser.add_argument("--evaluate", type=int, nargs="?", const=EVAL_EPISODES, default=0, metavar="N",
+                        help=f"play N greedy episodes (default {EVAL_EPISODES}) with the checkpoint or NumPy policy "
+                             "and report scores and death causes")
+    parser.add_argument("--eval-seed", type=int, default=0, metavar="S",
+                        help="first evaluation seed; episodes use seeds S .. S+N-1")
+    parser.add_argument("--eval-workers", type=int, default=0, metavar="N",
+                        help="evaluation worker processes (default: one per core)")
+    parser.add_argument("--starvation-cap", type=int, default=EVAL_STARVATION_STEPS, metavar="N",
+                        help="steps without food before an evaluation episode ends as starved (0 = never)")
+    parser.add_argument("--eval-output", default=None, metavar="FILE",
+                        help="write the evaluation report and per-episode results to FILE as JSON")
+    parser.add_argument("--sweep", choices=("grid", "random"), default=None,
+                        help="search WormAI hyperparameters with successive halving in worker processes")
+    parser.add_argument("--sweep-param", type=parse_sweep_param, action="append", default=[], metavar="NAME=V1,V2",
+                        help=f"values to try for one hyperparameter ({', '.join(SWEEP_SPACE)}); repeatable")
+    parser.add_argument("--sweep-trials", type=int, default=SWEEP_TRIALS, metavar="N",
+                        help="configurations drawn by --sweep random")
+    parser.add_argument("--sweep-budget", type=int, default=SWEEP_BUDGET, metavar="STEPS",
+                        help="env steps trained by trials that reach the last rung")
+    parser.add_argument("--sweep-eta", type=int, default=SWEEP_ETA, metavar="ETA",
+                        help="keep the best 1/ETA of trials at each rung")
+    parser.add_argument("--sweep-workers", type=int, default=0, metavar="N",
+                        help="sweep worker processes (default: one per core)")
+    parser.add_argument("--sweep-dir", default="sweep", metavar="DIR",
+                        help="where trial checkpoints and results.csv are written")
+    parser.add_argument("--grok-stub", type=float, default=None, metavar="SECONDS",
+                        help="answer Grok requests from a local stub server with this latency")
+    parser.add_argument("--grok-cache", default=None, metavar="FILE",
+                        help="persist cached Grok replies to FILE between runs")
+    args = parser.parse_args()
+    if args.arena and args.sequence_replay:
+        parser.error("--arena trains from flat replay; it cannot be combined with --sequence-replay")
+    
+    if args.evaluate:
+        policy = {"numpy": args.numpy_policy} if args.numpy_policy else {"checkpoint": args.checkpoint or CHECKPOINT_PATH}
+        try:
+            start = time.perf_counter()
+            seeds = list(range(args.eval_seed, args.eval_seed + args.evaluate))
+            results = evaluate_policy(policy, seeds, args.eval_workers, args.starvation_cap)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            logging.critical(f"Evaluation failed: {e}")
+            print(f"Evaluation failed: {e}")
+            sys.exit(1)
+            
+        report = evaluation_report(results)
+        print(f"Evaluated {report['episodes']} episodes in {elapsed:.1f}s")
+        for field in ("score", "steps", "length"):
+            stats = report[field]
+            print(f"  {field:<7} mean {stats['mean']:8.2f}  median {stats['median']:8.2f}  p95 {stats['p95']:8.2f}")
+        print("  deaths  " + ", ".join(f"{cause} {count}" for cause, count in report["causes"].items()))
+        if args.eval_output:
+            tmp_path = f"{args.eval_output}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"policy": policy, "report": report, "episodes": results}, f, indent=2)
+            os.replace(tmp_path, args.eval_output)
+        sys.exit(0)
+        
+    if args.sweep:
+        try:
+            runner = SweepRunner({**SWEEP_SPACE, **dict(args.sweep_param)}, args.sweep, args.sweep_trials,
+                                 args.sweep_budget, args.sweep_eta, workers=args.sweep_workers,
+                                 starvation_cap=args.starvation_cap, directory=args.sweep_dir)
+            best = runner.run()
+        except Exception as e:
+            logging.critical(f"Sweep failed: {e}")
+            print(f"Sweep failed: {e}")
+            sys.exit(1)
+            
+        print(f"Best trial {best['trial']}: score {best['score']:.2f}, "
+              f"{', '.join(f'{name}={best[name]}' for name in SWEEP_SPACE)}")
+        print(f"Results in {os.path.join(args.sweep_dir, 'results.csv')}, "
+              f"checkpoint in {runner.checkpoint_path(best['trial'])}")
+        sys.exit(0)
+        
     try:
+        # Optional offline Grok endpoint
+        grok_url = None
+        if args.grok_stub is not None:
+            grok_url = GrokStubServer(latency=args.grok_stub).start().url
+            
         # Create and run game
-        game = WormGame()
-        game.run()
+        headless = args.headless or args.train_steps > 0
+        checkpoint_path = args.checkpoint or (CHECKPOINT_PATH if args.resume or (args.offline and not args.write_shards) else None)
+        
+        # A resumed checkpoint brings its own hyperparameters, e.g. a sweep winner's
+        checkpoint = WormAI.read_checkpoint(checkpoint_path) if args.resume else None
+        hyperparameters = {"replay_size": args.replay_size, **(checkpoint or {}).get("hyperparameters", {})}
+        ai = WormAI(sequence_replay=args.sequence_replay, traced_policy=args.traced_policy,
+                    numpy_weights=args.numpy_policy, replay_dir=args.replay_dir,
+                    compact_replay=args.compact_replay, **hyperparameters)
+        # A resumed checkpoint that held the replay keeps holding it
+        checkpoint_replay = args.checkpoint_replay or (checkpoint is not None and "replay" in checkpoint)
+        if checkpoint is not None:
+            ai.load_checkpoint(checkpoint_path, checkpoint)
+            checkpoint = None
+        if checkpoint_path:
+            ai.enable_checkpoints(checkpoint_path, args.checkpoint_every, checkpoint_replay)
+        # Ctrl+C in any mode still stops the learner and writes the exit checkpoint and replay
+        try:
+            if args.offline and args.write_shards:
+                writer = TransitionShardWriter(args.write_shards)
+                for source in args.offline:
+                    for chunk in transition_chunks(source, ai):
+                        writer.add_batch(*chunk)
+                writer.close()
+                print(f"Wrote {writer.rows} transitions to {args.write_shards}")
+            elif args.offline:
+                OfflineTrainer(ai, args.offline, epochs=args.offline_epochs).train(args.train_steps or None)
+            elif args.play:
+                WormGame(ai=ai).play(EpisodeRecording(args.play), args.episode)
+            elif args.apex_actors:
+                trainer = ApexTrainer(args.apex_actors, ai).start()
+                try:
+                    trainer.train(args.train_steps or None)
+                finally:
+                    trainer.close()
+            elif args.arena:
+                WormArena(args.arena, ai, learn=ai.has_ai and ai.numpy_policy is None).run(args.train_steps or None)
+            else:
+                profiler = FrameProfiler(enabled=args.profile or bool(args.profile_export), export_path=args.profile_export)
+                recorder = EpisodeRecorder(args.record, args.record_q) if args.record else None
+                game = WormGame(headless=headless, grok_url=grok_url, grok_cache=args.grok_cache, ai=ai,
+                                profiler=profiler, recorder=recorder)
+                if args.learner_thread:
+                    ai.start_learner(args.learner_ratio)
+                try:
+                    if headless:
+                        game.train(args.train_steps or None, preview_every=args.preview_every)
+                    else:
+                        game.run()
+                finally:
+                    if recorder is not None:
+                        recorder.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ai.stop_learner()
+            ai.close_checkpoints()
+            ai.save_replay()
+            
+        # Export after training/playing so the NumPy backend gets the latest weights
+        if args.export_numpy:
+            if ai.has_ai and ai.numpy_policy is None:
+                ai.policy_net.export_numpy(args.export_numpy)
+            else:
+                print("--export-numpy needs a PyTorch policy")
     except Exception as e:
         logging.critical(f"Fatal error: {e}")
         print(f"Fatal error: {e}")